@@ -0,0 +1,106 @@
+"""
+Benchmark writing frames to the framebuffer: the whole frame, only the rows
+that changed, and only the rows that changed copied into a memory mapping
+
+A temporary file stands in for /dev/fb1. Run from the repository root with:
+
+    python -m benchmarks.framebuffer
+"""
+
+import functools
+import math
+import tempfile
+import time
+
+import numpy as np
+import pygame
+
+from starfinder.camera import SCREEN_HEIGHT, SCREEN_WIDTH, Camera
+from starfinder.framebuffer import FramebufferMap, FramebufferWriter
+from starfinder.labels import Labels
+from starfinder.stars import Stars
+from starfinder.text import text_renderer
+
+FRAMES = 120
+FOV = math.radians(60)
+FRAME = np.eye(3)
+
+# degrees the camera turns each frame in each scene
+SCENES = {
+    "still": 0.0,
+    "slow pan": 0.05,
+    "fast pan": 1.0,
+}
+
+
+def render_frames(surface: pygame.Surface, turn: float):
+    """
+    Render stars and a changing frame counter, like the fps display, turning
+    the camera each frame
+    """
+
+    rng = np.random.default_rng(0)
+    positions = rng.normal(size=(3000, 3))
+    positions /= np.linalg.norm(positions, axis=1)[:, np.newaxis]
+    stars = Stars(positions, rng.uniform(-1.5, 8, len(positions)), {}, [FOV])
+
+    labels = Labels()
+    text = text_renderer(12)
+
+    for frame in range(FRAMES):
+        camera = Camera(0, math.radians(180 + turn * frame), 0, FOV)
+
+        surface.fill((0, 0, 0))
+        stars.render(camera, surface, FRAME, labels)
+        labels.render(surface)
+        text.draw(surface, f"{frame % 30}", bottomright=(200, 200))
+
+        yield
+
+
+def write_full(file, surface: pygame.Surface) -> int:
+    """
+    The previous refresh, the whole frame every time
+    """
+
+    file.seek(0)
+    written = file.write(surface.get_buffer())
+    file.flush()
+    return written
+
+
+def main():
+    pygame.init()
+    surface = pygame.surface.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), 0, 16)
+
+    columns = ["full KB", "full ms", "rows KB", "rows ms", "map KB", "map ms"]
+    print(f"{'scene':>10}" + "".join(f" {column:>8}" for column in columns))
+    for name, turn in SCENES.items():
+        row = f"{name:>10}"
+
+        length = surface.get_pitch() * surface.get_height()
+        writers = [
+            lambda file: functools.partial(write_full, file),
+            lambda file: FramebufferWriter(file).write,
+            lambda file: FramebufferMap(file, length).write,
+        ]
+        for writer in writers:
+            # a fresh stand in for each, so none starts with another's frame
+            with tempfile.TemporaryFile() as file:
+                write = writer(file)
+
+                written = 0
+                elapsed = 0.0
+                for _ in render_frames(surface, turn):
+                    start = time.perf_counter()
+                    written += write(surface)
+                    elapsed += time.perf_counter() - start
+
+            row += f" {written / FRAMES / 1024:>8.1f}"
+            row += f" {elapsed / FRAMES * 1000:>8.3f}"
+
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
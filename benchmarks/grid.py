@@ -0,0 +1,94 @@
+"""
+Benchmark Grid.render at each zoom level, batching lines into polylines
+against drawing every segment on its own, and report how many segments are
+drawn per frame
+
+Run from the repository root with:
+
+    python -m benchmarks.grid
+"""
+
+import itertools
+import math
+import time
+import warnings
+
+import pygame
+
+import starfinder.grid
+from starfinder.camera import PHYSICAL_FOV, SCREEN_HEIGHT, SCREEN_WIDTH, Camera
+from starfinder.grid import Grid
+from starfinder.text import text_renderer
+
+FOVS = [PHYSICAL_FOV, math.radians(60), math.radians(120)]
+
+# camera orientations to average over, as (pitch, yaw) in degrees
+VIEWS = [(pitch, yaw) for pitch in range(-80, 81, 20) for yaw in range(0, 360, 45)]
+FRAMES = 5
+
+
+def render_segments(
+    surface: pygame.Surface, points: list[list[float]], counts: list[int]
+):
+    """
+    The previous renderer, one aaline call per segment
+    """
+
+    blend = surface.get_bytesize() > 2
+
+    start = 0
+    for count in counts:
+        stop = start + count
+        for a, b in itertools.pairwise(points[start:stop]):
+            pygame.draw.aaline(surface, (255, 255, 255), a, b, blend)
+        start = stop
+
+
+def time_render(grid: Grid, cameras: list[Camera], surface: pygame.Surface) -> float:
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        for camera in cameras:
+            surface.fill((0, 0, 0))
+            grid.render(camera, surface)
+    return (time.perf_counter() - start) / (FRAMES * len(cameras)) * 1000
+
+
+def main():
+    pygame.init()
+
+    # blend=False is deprecated, but the only safe way on 16 bit surfaces (see
+    # starfinder.grid.render_lines)
+    warnings.filterwarnings("ignore", "blend=False", DeprecationWarning)
+
+    # the device's 16 bit screen
+    surface = pygame.surface.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), 0, 16)
+    grid = Grid(text_renderer(36, (255, 255, 255), (0, 0, 0)))
+
+    polylines = starfinder.grid.render_lines
+
+    print(f"{'fov':>8} {'before ms':>10} {'after ms':>10} {'segments':>9} {'max':>6}")
+    for fov in FOVS:
+        cameras = [
+            Camera(math.radians(pitch), math.radians(yaw), 0, fov)
+            for pitch, yaw in VIEWS
+        ]
+
+        segments = []
+        for camera in cameras:
+            _, counts = grid.lines(camera)
+            segments.append(sum(counts) - len(counts))
+
+        starfinder.grid.render_lines = render_segments
+        before = time_render(grid, cameras, surface)
+
+        starfinder.grid.render_lines = polylines
+        after = time_render(grid, cameras, surface)
+
+        print(
+            f"{math.degrees(fov):>7.1f}° {before:>10.2f} {after:>10.2f}"
+            f" {sum(segments) / len(segments):>9.0f} {max(segments):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
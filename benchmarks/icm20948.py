@@ -0,0 +1,164 @@
+"""
+Count the I2C transactions per IMU sample: reading the magnetometer directly,
+reading all nine axes through the ICM20948's I2C master, and draining
+accelerometer and gyro samples from the FIFO
+
+Runs against a simulated bus, so no hardware is needed. Run from the
+repository root with:
+
+    python -m benchmarks.icm20948
+"""
+
+import ctypes
+import struct
+
+import numpy as np
+
+from starfinder.icm20948 import (
+    AK09916_CHIP_ID,
+    AK09916_CNTL3,
+    AK09916_HXL,
+    AK09916_I2C_ADDR,
+    AK09916_ST1,
+    AK09916_ST1_DRDY,
+    AK09916_ST2,
+    AK09916_WIA,
+    CHIP_ID,
+    ICM20948,
+    ICM20948_ACCEL_XOUT_H,
+    ICM20948_BANK_SEL,
+    ICM20948_EXT_SLV_SENS_DATA_00,
+    ICM20948_FIFO_COUNTH,
+    ICM20948_FIFO_R_W,
+    ICM20948_USER_CTRL,
+    ICM20948_USER_CTRL_I2C_MST_EN,
+    ICM20948_WHO_AM_I,
+)
+
+SAMPLES = 100
+
+# FIFO samples buffered between drains, 220 Hz drained at 50 Hz
+SAMPLES_PER_DRAIN = 220 // 50
+
+
+class SimulatedBus:
+    """
+    Just enough of an ICM20948 and AK09916 for the driver, with fixed readings
+    """
+
+    def __init__(self, seed: int = 0):
+        rng = np.random.default_rng(seed)
+
+        # the ICM20948's four register banks
+        self.banks = [bytearray(128) for _ in range(4)]
+        self.bank = 0
+        self.banks[0][ICM20948_WHO_AM_I] = CHIP_ID
+        struct.pack_into(
+            ">hhhhhh",
+            self.banks[0],
+            ICM20948_ACCEL_XOUT_H,
+            *rng.integers(-32768, 32768, 6).tolist(),
+        )
+
+        # accelerometer and gyro packets waiting in the FIFO
+        self.fifo = bytearray()
+
+        self.magnetometer = bytearray(64)
+        self.magnetometer[AK09916_WIA] = AK09916_CHIP_ID
+        self.magnetometer[AK09916_ST1] = AK09916_ST1_DRDY
+        struct.pack_into(
+            "<hhh",
+            self.magnetometer,
+            AK09916_HXL,
+            *rng.integers(-32768, 32768, 3).tolist(),
+        )
+
+    def write_byte_data(self, address: int, register: int, value: int):
+        if address == AK09916_I2C_ADDR:
+            # resets finish straight away
+            if register != AK09916_CNTL3:
+                self.magnetometer[register] = value
+        elif register == ICM20948_BANK_SEL:
+            self.bank = value >> 4
+        else:
+            self.banks[self.bank][register] = value
+
+    def read_byte_data(self, address: int, register: int) -> int:
+        return self.read_i2c_block_data(address, register, 1)[0]
+
+    def add_fifo_samples(self, count: int):
+        """
+        Buffer samples of the current accelerometer and gyro readings
+        """
+
+        start = ICM20948_ACCEL_XOUT_H
+        self.fifo += self.banks[0][start : start + 12] * count
+
+    def i2c_rdwr(self, write, read):
+        register = ctypes.string_at(write.buf, write.len)[0]
+        data = bytes(self.read_i2c_block_data(read.addr, register, read.len))
+        ctypes.memmove(read.buf, data, len(data))
+
+    def read_i2c_block_data(self, address: int, register: int, length: int):
+        if address == AK09916_I2C_ADDR:
+            return list(self.magnetometer[register : register + length])
+
+        if self.bank == 0 and register == ICM20948_FIFO_COUNTH:
+            return list(struct.pack(">H", len(self.fifo)))
+        if self.bank == 0 and register == ICM20948_FIFO_R_W:
+            data, self.fifo = self.fifo[:length], self.fifo[length:]
+            return list(data)
+
+        bank = self.banks[self.bank]
+        if self.bank == 0 and bank[ICM20948_USER_CTRL] & ICM20948_USER_CTRL_I2C_MST_EN:
+            # the I2C master's copy of the magnetometer
+            block = self.magnetometer[AK09916_ST1 : AK09916_ST2 + 1]
+            start = ICM20948_EXT_SLV_SENS_DATA_00
+            bank[start : start + len(block)] = block
+
+        return list(bank[register : register + length])
+
+
+def main():
+    direct = ICM20948(i2c_bus=SimulatedBus())
+    start = direct.transactions
+    for _ in range(SAMPLES):
+        magnetometer = direct.read_magnetometer_data()
+        direct_readings = direct.read_accelerometer_gyro_data() + magnetometer
+    direct_transactions = (direct.transactions - start) / SAMPLES
+
+    master = ICM20948(i2c_bus=SimulatedBus())
+    master.enable_i2c_master()
+    start = master.transactions
+    for _ in range(SAMPLES):
+        master_readings = master.read_sensor_data()
+    master_transactions = (master.transactions - start) / SAMPLES
+
+    bus = SimulatedBus()
+    fifo = ICM20948(i2c_bus=bus)
+    fifo.enable_i2c_master()
+    fifo.enable_fifo()
+    start = fifo.transactions
+    magnetometer = None
+    for _ in range(SAMPLES // SAMPLES_PER_DRAIN):
+        bus.add_fifo_samples(SAMPLES_PER_DRAIN)
+        samples = fifo.read_fifo()
+        assert len(samples) == SAMPLES_PER_DRAIN
+
+        # the simulated magnetometer never changes, so this is None after the
+        # first read
+        magnetometer = fifo.read_external_magnetometer_data() or magnetometer
+    fifo_readings = samples[-1] + magnetometer
+    fifo_transactions = (fifo.transactions - start) / SAMPLES
+
+    assert np.allclose(direct_readings, master_readings), "readings differ"
+    assert np.allclose(direct_readings, fifo_readings), "readings differ"
+
+    print(f"{'read':>10} {'transactions per sample':>24}")
+    print(f"{'direct':>10} {direct_transactions:>24.1f}")
+    print(f"{'master':>10} {master_transactions:>24.1f}")
+    print(f"{'fifo':>10} {fifo_transactions:>24.2f}")
+
+
+if __name__ == "__main__":
+    main()
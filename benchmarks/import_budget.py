@@ -0,0 +1,100 @@
+"""
+Report the import time of everything loaded before the loading screen, and
+check it against a budget
+
+Run from the repository root with:
+
+    python -m benchmarks.import_budget
+
+Exits with a non-zero status when over budget, so it can be checked on every
+release.
+"""
+
+import os
+import re
+import subprocess
+import sys
+
+# the module imported before the loading screen is drawn
+STARTUP_MODULE = "starfinder.main"
+
+# cumulative import time allowed before the loading screen, in milliseconds
+BUDGET_MS = 400
+
+# heavy modules that must only be imported after the loading screen is up
+DEFERRED_MODULES = [
+    "gpiozero",
+    "imufusion",
+    "pandas",
+    "pynmea2",
+    "serial",
+    "skyfield.api",
+    "skyfield.data.hipparcos",
+    "smbus2",
+]
+
+# only report modules that take at least this long, in milliseconds
+REPORT_THRESHOLD_MS = 5
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure_imports(module: str) -> list[tuple[str, int, float, float]]:
+    """
+    Import a module in a fresh interpreter with -X importtime
+
+    Returns:
+        A list of (module, depth, self ms, cumulative ms) in import order
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYGAME_HIDE_SUPPORT_PROMPT": "1"},
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(result.returncode)
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append(
+                (name, len(indent) // 2, int(self_us) / 1000, int(cumulative_us) / 1000)
+            )
+
+    return imports
+
+
+def main():
+    imports = measure_imports(STARTUP_MODULE)
+    imported = {name for name, _, _, _ in imports}
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, depth, self_ms, cumulative_ms in imports:
+        if cumulative_ms >= REPORT_THRESHOLD_MS:
+            print(f"{cumulative_ms:>14.1f} {self_ms:>9.1f}  {'  ' * depth}{name}")
+
+    total_ms = sum(
+        cumulative_ms for _, depth, _, cumulative_ms in imports if depth == 0
+    )
+    print(f"\ntotal: {total_ms:.1f} ms (budget {BUDGET_MS} ms)")
+
+    failures = []
+    if total_ms > BUDGET_MS:
+        failures.append(f"imports took {total_ms:.1f} ms, over {BUDGET_MS} ms")
+    for name in DEFERRED_MODULES:
+        if name in imported:
+            failures.append(f"{name} is imported before the loading screen")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark star rendering time against the number of stars
+
+Run from the repository root with:
+
+    python -m benchmarks.stars
+"""
+
+import math
+import time
+
+import numpy as np
+import pygame
+
+from starfinder.camera import PHYSICAL_FOV, SCREEN_HEIGHT, SCREEN_WIDTH, Camera
+from starfinder.labels import Labels
+from starfinder.stars import Stars
+
+STAR_COUNTS = [100, 300, 1000, 3000, 10000, 118000]
+FOVS = [PHYSICAL_FOV, math.radians(60), math.radians(120)]
+FRAME = np.eye(3)
+FRAMES = 60
+
+
+def random_positions(count: int, rng: np.random.Generator) -> np.ndarray:
+    positions = rng.normal(size=(count, 3))
+    return positions / np.linalg.norm(positions, axis=1)[:, np.newaxis]
+
+
+def main():
+    pygame.init()
+    surface = pygame.surface.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), 0, 16)
+    labels = Labels()
+    rng = np.random.default_rng(0)
+
+    print(f"{'stars':>8}" + "".join(f"{math.degrees(fov):>8.1f}°" for fov in FOVS))
+    print(f"{'':>8}" + "".join(f"{'ms/frame':>9}" for _ in FOVS))
+    for count in STAR_COUNTS:
+        stars = Stars(
+            random_positions(count, rng),
+            rng.uniform(-1.5, 12, count),
+            {},
+            FOVS,
+        )
+
+        row = f"{count:>8}"
+        for fov in FOVS:
+            camera = Camera(0, math.radians(180), 0, fov)
+
+            start = time.perf_counter()
+            for _ in range(FRAMES):
+                surface.fill((0, 0, 0))
+                stars.render(camera, surface, FRAME, labels)
+                labels.render(surface)
+            elapsed = time.perf_counter() - start
+
+            row += f"{elapsed / FRAMES * 1000:>9.2f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
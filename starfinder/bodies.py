@@ -1,28 +1,76 @@
 from dataclasses import dataclass
+from datetime import datetime, timezone
+import time
 from pygame import Surface
+import numpy as np
 import pygame
 from skyfield.units import Angle
 
-from starfinder.camera import Camera, HorizontalCoordinates
+from starfinder.camera import Camera
+from starfinder.labels import Labels
+from starfinder.sky_index import SkyIndex
+from starfinder.text import text_renderer
+
+# how long the table of body positions covers, and how far apart its samples are
+TABLE_SPAN = 24 * 60 * 60
+TABLE_INTERVAL = 30 * 60
+
+# body labels are placed before star labels, whose priority is their magnitude
+LABEL_PRIORITY = -100
 
 
 @dataclass
 class Body:
     name: str
-    coordinates: HorizontalCoordinates
     diameter: float
     label: Surface
     color: tuple[int, int, int] = (255, 255, 255)
     in_solar_system: bool = False
+    label_priority: float = LABEL_PRIORITY
 
 
 class Bodies:
-    def __init__(self, eph, observer):
-        font = pygame.font.Font(None, 24)
+    def __init__(
+        self,
+        eph,
+        location,
+        ts,
+        start: float,
+        span: float = TABLE_SPAN,
+        interval: float = TABLE_INTERVAL,
+    ):
+        """
+        Args:
+            eph: skyfield ephemeris
+            location: observer's location, relative to the solar system
+                barycenter
+            ts: skyfield Timescale
+            start: unix time the table of positions starts at
+            span: seconds the table covers
+            interval: seconds between samples in the table
+        """
+
+        text = text_renderer(24)
 
         self.bodies = []
 
-        for key, name, color in [
+        # sample every position over the table in one skyfield call per body
+        self.start = start
+        self.interval = interval
+        sample_times = start + np.arange(int(span // interval) + 1) * interval
+
+        # unix time skips leap seconds like UTC does, so each sample is exactly
+        # the UTC datetime it names
+        t = ts.from_datetimes(
+            [
+                datetime.fromtimestamp(sample_time, timezone.utc)
+                for sample_time in sample_times.tolist()
+            ]
+        )
+        observer = location.at(t)
+
+        table = []
+        for rank, (key, name, color) in enumerate([
             ("sun", "Sun", (255, 255, 240)),
             ("moon", "Moon", (255, 255, 250)),
             ("mercury", "Mercury", (250, 250, 250)),
@@ -33,10 +81,13 @@ class Bodies:
             ("uranus barycenter", "Uranus", (233, 255, 255)),
             ("neptune barycenter", "Neptune", (233, 255, 250)),
             ("pluto barycenter", "Pluto", (255, 248, 233)),
-        ]:
+        ]):
             p = eph[key]
             astrometric = observer.observe(p)
-            alt, az, d = astrometric.apparent().altaz()
+
+            # the apparent directions as ICRS rays
+            positions = astrometric.apparent().position.au.T
+            table.append(positions / np.linalg.norm(positions, axis=1)[:, np.newaxis])
 
             diameter = Angle(degrees=0.01)
             if key == "sun":
@@ -47,27 +98,96 @@ class Bodies:
             self.bodies.append(
                 Body(
                     name=name,
-                    coordinates=HorizontalCoordinates(
-                        altitude=alt,
-                        azimuth=az,
-                    ),
                     diameter=diameter,
-                    label=font.render(
-                        name,
-                        True,
-                        (255, 255, 255),
-                    ),
+                    label=text.render(name),
                     color=color,
                     in_solar_system=True,
+                    # in the order above, the sun and moon first
+                    label_priority=LABEL_PRIORITY + rank,
                 )
             )
 
-    def render(self, camera: Camera, surface: Surface):
-        for body in self.bodies:
-            pos = camera.project(body.coordinates)
-            if not pos:
+        # (samples, bodies, 3)
+        table = np.stack(table, axis=1)
+
+        # index the bodies by sky tile at the middle of the table, there are
+        # only a few so use big tiles
+        middle = table[len(table) // 2]
+        self.index = SkyIndex(middle, subdivisions=2)
+        self.table = table[:, self.index.order]
+        self.bodies = [self.bodies[i] for i in self.index.order]
+
+        # how far any body strays from its indexed position over the table
+        self.max_motion = float(
+            np.max(np.arccos(np.clip(np.sum(table * middle, axis=2), -1, 1)))
+        )
+
+        # the largest body decides how far outside the view to look
+        self.max_diameter = max(body.diameter.radians for body in self.bodies)
+
+    @property
+    def end(self) -> float:
+        """
+        Unix time the table of positions ends at
+        """
+
+        return self.start + (len(self.table) - 1) * self.interval
+
+    def positions_at(self, unix_time: float) -> np.ndarray:
+        """
+        Interpolate the (N, 3) ICRS rays to every body from the table, times
+        outside of the table are clamped to its ends
+        """
+
+        sample = (unix_time - self.start) / self.interval
+        sample = min(max(sample, 0), len(self.table) - 1)
+
+        i = min(int(sample), len(self.table) - 2)
+        fraction = sample - i
+
+        positions = self.table[i] * (1 - fraction) + self.table[i + 1] * fraction
+        return positions / np.linalg.norm(positions, axis=1)[:, np.newaxis]
+
+    def render(
+        self,
+        camera: Camera,
+        surface: Surface,
+        frame: np.ndarray,
+        labels: Labels,
+    ):
+        """
+        Args:
+            frame: rotation from ICRS rays to horizontal rays (see SkyFrame)
+            labels: where the body labels are added for this frame
+        """
+
+        positions = self.positions_at(time.time())
+
+        # only look at the bodies in the sky tiles around the view
+        direction, half_angle = camera.view_cone(frame)
+        indices = self.index.query(
+            direction,
+            half_angle + 5 * self.max_diameter + self.max_motion,
+        )
+
+        # cull the bodies that can't reach the visible screen, even at 5 times
+        # their size
+        screen_points, valid_mask = camera.project_points(
+            positions[indices],
+            frame,
+            5 * max(1, camera.project_angle(Angle(radians=self.max_diameter))) / 2,
+        )
+
+        for i, (x, y), valid in zip(
+            indices.tolist(),
+            screen_points.tolist(),
+            valid_mask.tolist(),
+        ):
+            if not valid:
                 continue
 
+            body = self.bodies[i]
+
             # calculate the diameter of the body
             diameter = camera.project_angle(body.diameter)
             diameter = max(1, diameter)
@@ -80,13 +200,14 @@ class Bodies:
             pygame.draw.circle(
                 surface,
                 body.color,
-                pos.to_tuple(),
+                (x, y),
                 diameter / 2,
             )
 
-            # render label under the body
-            label = body.label.get_rect()
-            label.centerx = pos.x
-            label.top = pos.y + diameter / 2.0 + 6
-
-            surface.blit(body.label, label)
+            labels.add(
+                ("body", body.name),
+                body.label,
+                (x, y),
+                diameter / 2,
+                body.label_priority,
+            )
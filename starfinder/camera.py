@@ -1,10 +1,13 @@
 from dataclasses import dataclass
+import functools
 import math
 from typing import Optional
 from skyfield.units import Angle
 
 import numpy as np
 
+from starfinder import quaternion as quaternions
+
 
 SCREEN_WIDTH = 240
 SCREEN_HEIGHT = 240
@@ -12,6 +15,11 @@ HALF_SCREEN_WIDTH = SCREEN_WIDTH / 2
 HALF_SCREEN_HEIGHT = SCREEN_HEIGHT / 2
 ASPECT_RATIO = SCREEN_WIDTH / SCREEN_HEIGHT
 
+# the visible part of the screen, "circle" for the round LCD, which only shows
+# the circle inscribed in the square, or "square"
+SCREEN_SHAPE = "circle"
+SCREEN_RADIUS = min(HALF_SCREEN_WIDTH, HALF_SCREEN_HEIGHT)
+
 PHYSICAL_FOV = math.radians(17.58)
 
 
@@ -30,48 +38,289 @@ class ScreenPoint:
         return self.x, self.y
 
 
-@dataclass
-class Camera:
-    pitch: float
-    yaw: float
-    roll: float
-    fov: float
-
-    def __post_init__(self):
-        # calculate the rotation matrix
-        yaw_matrix = np.array(
-            [
-                [math.cos(self.yaw), 0, math.sin(self.yaw)],
-                [0, 1, 0],
-                [-math.sin(self.yaw), 0, math.cos(self.yaw)],
-            ]
+def horizontal_to_vectors(altitudes, azimuths) -> np.ndarray:
+    """
+    Convert altitudes and azimuths (in radians) to an (N, 3) array of unit rays
+    """
+
+    altitudes = np.asarray(altitudes, dtype=float)
+    azimuths = np.asarray(azimuths, dtype=float)
+    cos_altitudes = np.cos(-altitudes)
+
+    return np.stack(
+        [
+            np.sin(azimuths) * cos_altitudes,
+            np.sin(-altitudes),
+            np.cos(azimuths) * cos_altitudes,
+        ],
+        axis=-1,
+    )
+
+
+def vectors_to_horizontal(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Convert an (N, 3) array of unit rays to altitudes and azimuths (in radians)
+    """
+
+    altitudes = np.arcsin(np.clip(-vectors[..., 1], -1, 1))
+    azimuths = np.arctan2(vectors[..., 0], vectors[..., 2])
+
+    return altitudes, azimuths
+
+
+def view_half_angle(fov: float) -> float:
+    """
+    Angle from the center of the view to the furthest visible pixel in radians,
+    the screen corners or the edge of the circle
+    """
+
+    # distance of the furthest visible pixel from the center in camera space
+    if SCREEN_SHAPE == "circle":
+        extent = SCREEN_RADIUS / HALF_SCREEN_WIDTH
+    else:
+        extent = math.hypot(1, 1 / ASPECT_RATIO)
+
+    corner = extent * fov / math.pi
+    return math.asin(corner) if corner < 1 else math.pi / 2
+
+
+def on_screen_mask(screen_points: np.ndarray, margin: float = 0) -> np.ndarray:
+    """
+    Mask of screen points that land on the visible screen, allowing for a margin
+    around the edges so partially visible shapes are kept
+    """
+
+    if SCREEN_SHAPE == "circle":
+        x = screen_points[:, 0] - HALF_SCREEN_WIDTH
+        y = screen_points[:, 1] - HALF_SCREEN_HEIGHT
+        return x * x + y * y < (SCREEN_RADIUS + margin) ** 2
+
+    return (
+        (screen_points[:, 0] >= -margin)
+        & (screen_points[:, 0] < SCREEN_WIDTH + margin)
+        & (screen_points[:, 1] >= -margin)
+        & (screen_points[:, 1] < SCREEN_HEIGHT + margin)
+    )
+
+
+def on_screen_rect(rect: tuple[float, float, float, float]) -> bool:
+    """
+    Whether any of an (x, y, width, height) rect lands on the visible screen
+    """
+
+    x, y, width, height = rect
+    if SCREEN_SHAPE == "circle":
+        # the point of the rect closest to the center
+        nearest_x = min(max(HALF_SCREEN_WIDTH, x), x + width)
+        nearest_y = min(max(HALF_SCREEN_HEIGHT, y), y + height)
+        return (
+            math.hypot(nearest_x - HALF_SCREEN_WIDTH, nearest_y - HALF_SCREEN_HEIGHT)
+            < SCREEN_RADIUS
         )
 
-        pitch_matrix = np.array(
-            [
-                [1, 0, 0],
-                [0, math.cos(self.pitch), -math.sin(self.pitch)],
-                [0, math.sin(self.pitch), math.cos(self.pitch)],
-            ]
-        )
+    return x < SCREEN_WIDTH and y < SCREEN_HEIGHT and x + width > 0 and y + height > 0
 
-        roll_matrix = np.array(
-            [
-                [math.cos(self.roll), -math.sin(self.roll), 0],
-                [math.sin(self.roll), math.cos(self.roll), 0],
-                [0, 0, 1],
-            ]
-        )
 
-        # Apply rotations in yaw-pitch-roll order
-        self.transformation_matrix = np.dot(
-            np.dot(
-                roll_matrix,
-                pitch_matrix,
-            ),
-            yaw_matrix,
+@functools.lru_cache(maxsize=1)
+def visible_pixels() -> np.ndarray:
+    """
+    Read only (SCREEN_HEIGHT, SCREEN_WIDTH) mask of the pixels that are shown
+    """
+
+    ys, xs = np.mgrid[0:SCREEN_HEIGHT, 0:SCREEN_WIDTH] + 0.5
+    screen_points = np.stack([xs.ravel(), ys.ravel()], axis=-1)
+
+    mask = on_screen_mask(screen_points).reshape(SCREEN_HEIGHT, SCREEN_WIDTH)
+    mask.setflags(write=False)
+    return mask
+
+
+class Camera:
+    """
+    A camera that is updated in place
+
+    The orientation is set either as pitch, yaw and roll or as a quaternion.
+    The rotation matrix is rebuilt only when the orientation actually changes,
+    and since it is orthonormal its inverse is just the transpose.
+    """
+
+    def __init__(self, pitch: float, yaw: float, roll: float, fov: float):
+        self._pitch = pitch
+        self._yaw = yaw
+        self._roll = roll
+        self._fov = fov
+
+        # incremented every time the camera changes
+        self.revision = 0
+
+        self._transformation_matrix = np.empty((3, 3))
+        self._rotation_dirty = True
+
+        # the quaternion the orientation was last set with, the angles are
+        # worked out from it when they're asked for
+        self._quaternion = None
+        self._angles_dirty = False
+
+        self._ray_table = None
+        self._ray_table_revision = None
+
+    def __repr__(self) -> str:
+        return (
+            f"Camera(pitch={self.pitch!r}, yaw={self.yaw!r}, "
+            f"roll={self.roll!r}, fov={self.fov!r})"
         )
-        self.inv_transformation_matrix = np.linalg.inv(self.transformation_matrix)
+
+    @property
+    def pitch(self) -> float:
+        if self._angles_dirty:
+            self._update_angles()
+        return self._pitch
+
+    @pitch.setter
+    def pitch(self, value: float):
+        if value != self.pitch:
+            self._pitch = value
+            self._quaternion = None
+            self._rotation_dirty = True
+            self.revision += 1
+
+    @property
+    def yaw(self) -> float:
+        if self._angles_dirty:
+            self._update_angles()
+        return self._yaw
+
+    @yaw.setter
+    def yaw(self, value: float):
+        if value != self.yaw:
+            self._yaw = value
+            self._quaternion = None
+            self._rotation_dirty = True
+            self.revision += 1
+
+    @property
+    def roll(self) -> float:
+        if self._angles_dirty:
+            self._update_angles()
+        return self._roll
+
+    @roll.setter
+    def roll(self, value: float):
+        if value != self.roll:
+            self._roll = value
+            self._quaternion = None
+            self._rotation_dirty = True
+            self.revision += 1
+
+    @property
+    def fov(self) -> float:
+        return self._fov
+
+    @fov.setter
+    def fov(self, value: float):
+        if value != self._fov:
+            self._fov = value
+            self.revision += 1
+
+    def update(
+        self,
+        pitch: Optional[float] = None,
+        yaw: Optional[float] = None,
+        roll: Optional[float] = None,
+        fov: Optional[float] = None,
+        quaternion: Optional[np.ndarray] = None,
+    ):
+        """
+        Update the camera in place, leaving out any values that are None
+
+        Args:
+            quaternion: unit (w, x, y, z) quaternion from horizontal rays to
+                camera rays, instead of pitch, yaw and roll
+        """
+
+        if quaternion is not None:
+            self.set_quaternion(quaternion)
+        if pitch is not None:
+            self.pitch = pitch
+        if yaw is not None:
+            self.yaw = yaw
+        if roll is not None:
+            self.roll = roll
+        if fov is not None:
+            self.fov = fov
+
+    def set_quaternion(self, quaternion: np.ndarray):
+        """
+        Set the orientation from a unit (w, x, y, z) quaternion from horizontal
+        rays to camera rays
+        """
+
+        if self._quaternion is not None and np.array_equal(
+            quaternion, self._quaternion
+        ):
+            return
+
+        self._quaternion = quaternion
+        quaternions.to_matrix(quaternion, self._transformation_matrix)
+        self._rotation_dirty = False
+        self._angles_dirty = True
+        self.revision += 1
+
+    @property
+    def transformation_matrix(self) -> np.ndarray:
+        """
+        Rotation from world rays to camera rays
+        """
+
+        if self._rotation_dirty:
+            self._update_rotation()
+        return self._transformation_matrix
+
+    @property
+    def inv_transformation_matrix(self) -> np.ndarray:
+        """
+        Rotation from camera rays to world rays
+        """
+
+        # the rotation is orthonormal, so the transpose is the inverse
+        return self.transformation_matrix.T
+
+    def _update_rotation(self):
+        """
+        Rebuild the rotation matrix in place
+        """
+
+        cp, sp = math.cos(self._pitch), math.sin(self._pitch)
+        cy, sy = math.cos(self._yaw), math.sin(self._yaw)
+        cr, sr = math.cos(self._roll), math.sin(self._roll)
+
+        # Apply rotations in yaw-pitch-roll order, this is the expanded form of
+        # roll_matrix . pitch_matrix . yaw_matrix
+        m = self._transformation_matrix
+        m[0, 0] = cr * cy - sr * sp * sy
+        m[0, 1] = -sr * cp
+        m[0, 2] = cr * sy + sr * sp * cy
+        m[1, 0] = sr * cy + cr * sp * sy
+        m[1, 1] = cr * cp
+        m[1, 2] = sr * sy - cr * sp * cy
+        m[2, 0] = -cp * sy
+        m[2, 1] = sp
+        m[2, 2] = cp * cy
+
+        self._rotation_dirty = False
+
+    def _update_angles(self):
+        """
+        Work out pitch, yaw and roll from the rotation matrix, the inverse of
+        _update_rotation
+        """
+
+        m = self._transformation_matrix
+        self._pitch = math.asin(min(max(m[2, 1], -1), 1))
+        self._yaw = math.atan2(-m[2, 0], m[2, 2])
+        self._roll = math.atan2(-m[0, 1], m[1, 1])
+
+        self._angles_dirty = False
 
     def project(self, hc: HorizontalCoordinates) -> Optional[ScreenPoint]:
         """
@@ -109,16 +358,32 @@ class Camera:
             (poi[1] * HALF_SCREEN_HEIGHT * ASPECT_RATIO) + HALF_SCREEN_HEIGHT,
         )
 
-    def project_points(self, pois: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    def project_points(
+        self,
+        pois: np.ndarray,
+        frame: Optional[np.ndarray] = None,
+        margin: Optional[float] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
         """
         Project an array of rays to screen pixels
 
+        Args:
+            pois: (N, 3) array of rays
+            frame: optional rotation from the frame of the rays to horizontal
+                rays, like a SkyFrame matrix for ICRS rays
+            margin: if given, points further than this many pixels outside the
+                visible screen are culled too (see on_screen_mask)
+
         Returns:
             A tuple containing the screen points and a mask of valid points
         """
 
+        matrix = self.transformation_matrix
+        if frame is not None:
+            matrix = np.dot(matrix, frame)
+
         # Rotate the pois relative to the camera
-        pois = np.dot(self.transformation_matrix, pois.T).T
+        pois = np.dot(matrix, pois.T).T
 
         # Create a mask for points in front of the camera
         valid_mask = pois[:, 2] >= 0
@@ -135,8 +400,41 @@ class Camera:
             pois[:, 1] * HALF_SCREEN_HEIGHT * ASPECT_RATIO
         ) + HALF_SCREEN_HEIGHT
 
+        if margin is not None:
+            valid_mask &= on_screen_mask(screen_points, margin)
+
         return screen_points, valid_mask
 
+    def view_cone(
+        self,
+        frame: Optional[np.ndarray] = None,
+    ) -> tuple[np.ndarray, float]:
+        """
+        A cone around the camera's view that contains the whole screen
+
+        Args:
+            frame: optional rotation from another frame to horizontal rays, the
+                cone is returned in that frame
+
+        Returns:
+            A tuple containing the unit ray along the center of the view and the
+            angle from the center to the furthest visible pixel in radians
+        """
+
+        # the camera looks along z, so the world ray is the transpose's z column
+        direction = self.transformation_matrix[2]
+        if frame is not None:
+            direction = np.dot(direction, frame)
+
+        return direction, view_half_angle(self.fov)
+
+    def unproject_length(self, length: float) -> float:
+        """
+        Project a screen length back to an angle in radians
+        """
+
+        return length * self.fov / SCREEN_WIDTH
+
     def project_angle(self, length: Angle) -> float:
         """
         Project a degree length to a screen length
@@ -151,31 +449,101 @@ class Camera:
         """
         Project a screen pixel back to a ray in the sky
         """
-        # Convert screen coordinates back to normalized device coordinates
-        x_ndc = (sp.x - HALF_SCREEN_WIDTH) / HALF_SCREEN_WIDTH
-        y_ndc = (sp.y - HALF_SCREEN_HEIGHT) / (
-            HALF_SCREEN_HEIGHT * SCREEN_WIDTH / SCREEN_HEIGHT
+
+        rays, valid_mask = self.inverse_project_points(
+            np.array([[sp.x, sp.y]], dtype=float)
         )
+        if not valid_mask[0]:
+            return None
 
-        # Adjust for field of view
-        x_ndc *= self.fov / math.pi
-        y_ndc *= self.fov / math.pi
-        z_ndc = max(0.0, math.cos(x_ndc) * math.cos(y_ndc))
+        altitudes, azimuths = vectors_to_horizontal(rays)
 
-        # Create a point
-        poi = np.array([x_ndc, y_ndc, z_ndc])
+        # Return the horizontal coordinates
+        return HorizontalCoordinates(
+            altitude=Angle(radians=altitudes[0]),
+            azimuth=Angle(radians=azimuths[0]),
+        )
 
-        # Apply the inverse of the camera's transformation matrix to get the world coordinates
-        poi = np.dot(np.linalg.inv(self.transformation_matrix), poi)
+    def inverse_project_points(
+        self, screen_points: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Project an array of screen pixels back to rays in the sky
 
-        # Normalize the poi
-        poi /= np.linalg.norm(poi)
+        Returns:
+            A tuple containing the (N, 3) unit rays and a mask of valid points,
+            points outside of the visible hemisphere are not valid
+        """
 
-        # Calculate altitude and azimuth from the poi
-        altitude = math.asin(-poi[1])
-        azimuth = math.atan2(poi[0], poi[2])
+        rays, valid_mask = screen_to_camera_rays(screen_points, self.fov)
 
-        # Return the horizontal coordinates
-        return HorizontalCoordinates(
-            altitude=Angle(radians=altitude), azimuth=Angle(radians=azimuth)
-        )
+        # Apply the inverse of the camera's rotation, rays @ T is T.T @ rays
+        return np.dot(rays, self.transformation_matrix), valid_mask
+
+    def screen_ray_table(self) -> np.ndarray:
+        """
+        The ray in the sky behind every screen pixel center
+
+        Returns:
+            A (SCREEN_HEIGHT, SCREEN_WIDTH, 3) array of unit rays, rays outside
+            of the visible hemisphere are zero. The result is shared until the
+            camera changes and must not be modified.
+        """
+
+        if self._ray_table_revision != self.revision:
+            self._ray_table = np.dot(screen_rays(self.fov), self.transformation_matrix)
+            self._ray_table.setflags(write=False)
+            self._ray_table_revision = self.revision
+
+        return self._ray_table
+
+
+def screen_to_camera_rays(
+    screen_points: np.ndarray, fov: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Invert the projection of Camera.project_points for a camera looking straight
+    ahead
+
+    Returns:
+        A tuple containing the (N, 3) unit rays in camera space and a mask of
+        valid points
+    """
+
+    rays = np.empty((screen_points.shape[0], 3))
+
+    # Convert screen coordinates back to normalized device coordinates and
+    # adjust for field of view
+    rays[:, 0] = (screen_points[:, 0] - HALF_SCREEN_WIDTH) / HALF_SCREEN_WIDTH
+    rays[:, 1] = (screen_points[:, 1] - HALF_SCREEN_HEIGHT) / (
+        HALF_SCREEN_HEIGHT * ASPECT_RATIO
+    )
+    rays[:, :2] *= fov / math.pi
+
+    # The projection drops z, so recover it from the unit length
+    z_squared = 1 - rays[:, 0] ** 2 - rays[:, 1] ** 2
+    valid_mask = z_squared >= 0
+    rays[:, 2] = np.sqrt(np.maximum(z_squared, 0))
+    rays[~valid_mask] = 0
+
+    return rays, valid_mask
+
+
+@functools.lru_cache(maxsize=4)
+def screen_rays(fov: float) -> np.ndarray:
+    """
+    Camera space rays behind every screen pixel center for a field of view
+
+    Returns:
+        A read only (SCREEN_HEIGHT, SCREEN_WIDTH, 3) array of unit rays, rays
+        outside of the visible hemisphere are zero
+    """
+
+    ys, xs = np.mgrid[0:SCREEN_HEIGHT, 0:SCREEN_WIDTH] + 0.5
+    screen_points = np.stack([xs.ravel(), ys.ravel()], axis=-1)
+
+    rays, _ = screen_to_camera_rays(screen_points, fov)
+    rays = rays.reshape(SCREEN_HEIGHT, SCREEN_WIDTH, 3)
+    rays.setflags(write=False)
+
+    return rays
@@ -0,0 +1,205 @@
+"""
+A compact binary cache of the hipparcos star catalog
+
+Parsing hip_main.dat with pandas dominates startup, so the filtered and
+magnitude sorted catalog is written once to a columnar binary file next to it.
+Later startups memory map the columns directly. The cache records the size and
+modification time of the source file and is rebuilt when they change.
+
+File layout, little endian:
+    header (see HEADER)
+    positions   float32 (N, 3) ICRS unit rays at the catalog epoch
+    magnitudes  float32 (N,)
+    hip         int32   (N,)
+    ra_mas_per_year   float32 (N,) already scaled by cos(dec)
+    dec_mas_per_year  float32 (N,)
+"""
+
+from dataclasses import dataclass
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+
+from starfinder.sky_frame import radec_to_vectors
+
+CACHE_MAGIC = b"SFSTARS\0"
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".starfinder"
+
+# magic, version, star count, epoch year, source size, source mtime in ns
+HEADER = struct.Struct("<8sIIdQQ")
+
+COLUMNS = [
+    ("positions", np.dtype("<f4"), 3),
+    ("magnitudes", np.dtype("<f4"), 1),
+    ("hip", np.dtype("<i4"), 1),
+    ("ra_mas_per_year", np.dtype("<f4"), 1),
+    ("dec_mas_per_year", np.dtype("<f4"), 1),
+]
+
+
+@dataclass
+class Catalog:
+    positions: np.ndarray
+    magnitudes: np.ndarray
+    hip: np.ndarray
+    ra_mas_per_year: np.ndarray
+    dec_mas_per_year: np.ndarray
+    epoch_year: float
+
+    def __len__(self) -> int:
+        return len(self.magnitudes)
+
+
+def catalog_from_dataframe(hpc) -> Catalog:
+    """
+    Filter and sort a hipparcos dataframe into a catalog
+    """
+
+    # ignore NaN values in the hipparcos data
+    # (https://rhodesmill.org/skyfield/stars.html#stars-with-nan-positions)
+    hpc = hpc[hpc["ra_degrees"].notnull() & hpc["magnitude"].notnull()]
+
+    # order by brightness
+    hpc = hpc.sort_values(by="magnitude", kind="stable")
+
+    epoch_years = hpc["epoch_year"].unique()
+    if len(epoch_years) > 1:
+        raise ValueError("hipparcos stars must share one epoch")
+
+    return Catalog(
+        positions=radec_to_vectors(
+            np.radians(hpc["ra_degrees"].to_numpy()),
+            np.radians(hpc["dec_degrees"].to_numpy()),
+        ).astype(np.float32),
+        magnitudes=hpc["magnitude"].to_numpy(np.float32),
+        hip=hpc.index.to_numpy(np.int32),
+        ra_mas_per_year=hpc["ra_mas_per_year"].fillna(0).to_numpy(np.float32),
+        dec_mas_per_year=hpc["dec_mas_per_year"].fillna(0).to_numpy(np.float32),
+        epoch_year=float(epoch_years[0]) if len(epoch_years) else 0.0,
+    )
+
+
+def write_catalog(path: str, catalog: Catalog, source_stat: os.stat_result):
+    """
+    Write a catalog cache, replacing any existing file at once
+
+    Raises:
+        OSError: if the cache can't be written, no partial file is left behind
+    """
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(
+                HEADER.pack(
+                    CACHE_MAGIC,
+                    CACHE_VERSION,
+                    len(catalog),
+                    catalog.epoch_year,
+                    source_stat.st_size,
+                    source_stat.st_mtime_ns,
+                )
+            )
+            for name, dtype, _ in COLUMNS:
+                f.write(np.ascontiguousarray(getattr(catalog, name), dtype).tobytes())
+
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_catalog(
+    path: str,
+    source_stat: Optional[os.stat_result] = None,
+) -> Catalog:
+    """
+    Memory map a catalog cache
+
+    Raises:
+        ValueError: if the cache is not valid, or doesn't match the source file
+    """
+
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise ValueError("catalog cache is truncated")
+
+    magic, version, count, epoch_year, source_size, source_mtime_ns = HEADER.unpack(
+        header
+    )
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        raise ValueError("catalog cache has an unknown format")
+    if source_stat is not None and (
+        source_stat.st_size != source_size
+        or source_stat.st_mtime_ns != source_mtime_ns
+    ):
+        raise ValueError("catalog cache is out of date")
+
+    expected_size = HEADER.size + sum(
+        dtype.itemsize * width * count for _, dtype, width in COLUMNS
+    )
+    if os.path.getsize(path) != expected_size:
+        raise ValueError("catalog cache is truncated")
+
+    columns = {}
+    offset = HEADER.size
+    for name, dtype, width in COLUMNS:
+        shape = (count, width) if width > 1 else (count,)
+        columns[name] = (
+            np.memmap(path, dtype, "r", offset, shape)
+            if count
+            else np.empty(shape, dtype)
+        )
+        offset += dtype.itemsize * width * count
+
+    return Catalog(epoch_year=epoch_year, **columns)
+
+
+def load_catalog(loader, url: str) -> Catalog:
+    """
+    Load the hipparcos catalog through its cache, rebuilding the cache when the
+    source file changes
+
+    Args:
+        loader: skyfield Loader that downloads and stores the source file
+        url: url of hip_main.dat
+    """
+
+    source_path = loader.path_to(os.path.basename(url))
+    cache_path = source_path + CACHE_SUFFIX
+
+    # without the source file, any cache is better than a download
+    if not os.path.exists(source_path) and os.path.exists(cache_path):
+        try:
+            return read_catalog(cache_path)
+        except ValueError:
+            pass
+
+    # downloads the source file if needed
+    with loader.open(url) as f:
+        source_stat = os.stat(source_path)
+
+        try:
+            return read_catalog(cache_path, source_stat)
+        except (OSError, ValueError):
+            pass
+
+        from skyfield.data import hipparcos
+
+        catalog = catalog_from_dataframe(hipparcos.load_dataframe(f))
+
+    # a read only or full disk only costs the next startup the parse
+    try:
+        write_catalog(cache_path, catalog, source_stat)
+    except OSError as e:
+        print(f"Failed to write star catalog cache: {e}")
+        return catalog
+
+    return read_catalog(cache_path, source_stat)
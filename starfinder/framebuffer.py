@@ -0,0 +1,207 @@
+"""
+Writing frames to the framebuffer device
+
+Only the rows that changed since the last frame are written, most frames only
+change a small part of the screen (the frame rate, a few stars). Pixels the
+screen doesn't show (see SCREEN_SHAPE) are neither compared nor written at the
+ends of each run of rows.
+
+FramebufferMap copies frames into a memory mapping of the device, without a
+write call per run of rows. FramebufferWriter writes through the file instead,
+for when the device can't be mapped.
+"""
+
+import atexit
+import functools
+import mmap
+import os
+import stat
+from typing import BinaryIO, Union
+
+import numpy as np
+from pygame import Surface
+
+from starfinder.camera import SCREEN_HEIGHT, SCREEN_WIDTH, visible_pixels
+
+
+@functools.lru_cache(maxsize=4)
+def visible_bytes(
+    width: int, height: int, pitch: int, bytesize: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Which bytes of a frame are shown on the screen (see SCREEN_SHAPE)
+
+    Returns:
+        A tuple containing the (height, pitch) mask of shown bytes, and where
+        the shown bytes of each row start and stop
+    """
+
+    mask = np.zeros((height, pitch), dtype=bool)
+    if (width, height) == (SCREEN_WIDTH, SCREEN_HEIGHT):
+        mask[:, : width * bytesize] = np.repeat(visible_pixels(), bytesize, axis=1)
+    else:
+        mask[:, : width * bytesize] = True
+
+    starts = np.argmax(mask, axis=1)
+    stops = pitch - np.argmax(mask[:, ::-1], axis=1)
+
+    for array in (mask, starts, stops):
+        array.setflags(write=False)
+    return mask, starts, stops
+
+
+def changed_spans(
+    surface: Surface, pixels: np.ndarray, previous: np.ndarray
+) -> list[tuple[int, int]]:
+    """
+    The (start, stop) byte offsets of each run of rows whose shown pixels differ
+    between two frames, leaving out the hidden bytes before the first row and
+    after the last
+    """
+
+    visible, starts, stops = visible_bytes(
+        surface.get_width(), *pixels.shape, surface.get_bytesize()
+    )
+
+    changed = np.any((pixels != previous) & visible, axis=1)
+
+    # rising and falling edges mark the start and stop of each run
+    edges = np.flatnonzero(np.diff(changed, prepend=False, append=False))
+
+    pitch = pixels.shape[1]
+    return [
+        (start * pitch + starts[start], (stop - 1) * pitch + stops[stop - 1])
+        for start, stop in zip(edges[::2].tolist(), edges[1::2].tolist())
+    ]
+
+
+class FramebufferWriter:
+    def __init__(self, file: BinaryIO):
+        """
+        Args:
+            file: the framebuffer, opened for writing. Any seekable file works
+                as a stand in.
+        """
+
+        self.file = file
+
+        # the last frame written, None until the first full write
+        self.previous = None
+
+        self.frames = 0
+        self.bytes_written = 0
+
+    def write(self, surface: Surface) -> int:
+        """
+        Write the rows of a surface that changed since the last write
+
+        The surface must match the framebuffer's pixel format and line length.
+
+        Returns:
+            The number of bytes written
+        """
+
+        pixels = np.frombuffer(surface.get_buffer(), dtype=np.uint8)
+        pixels = pixels.reshape(surface.get_height(), surface.get_pitch())
+
+        if self.previous is None or self.previous.shape != pixels.shape:
+            # nothing to compare against, write everything
+            self.previous = pixels.copy()
+            spans = [(0, pixels.size)]
+        else:
+            spans = changed_spans(surface, pixels, self.previous)
+
+        pixels = pixels.reshape(-1)
+        previous = self.previous.reshape(-1)
+
+        written = 0
+        for start, stop in spans:
+            self.file.seek(start)
+            self.file.write(pixels[start:stop].data)
+            previous[start:stop] = pixels[start:stop]
+            written += stop - start
+
+        if written:
+            self.file.flush()
+
+        self.frames += 1
+        self.bytes_written += written
+        return written
+
+
+class FramebufferMap:
+    def __init__(self, file: BinaryIO, length: int):
+        """
+        Args:
+            file: the framebuffer, opened for reading and writing. Any file
+                works as a stand in, it's grown to length if it's shorter.
+            length: size of a frame in bytes
+        """
+
+        status = os.fstat(file.fileno())
+        if stat.S_ISREG(status.st_mode) and status.st_size < length:
+            file.truncate(length)
+
+        self.mapping = mmap.mmap(file.fileno(), length)
+
+        # the mapping holds the last frame, so it's what frames are compared to
+        self.previous = np.frombuffer(self.mapping, dtype=np.uint8)
+
+        self.frames = 0
+        self.bytes_written = 0
+
+    def write(self, surface: Surface) -> int:
+        """
+        Copy the rows of a surface that differ from the framebuffer into it
+
+        The surface must match the framebuffer's pixel format and line length.
+
+        Returns:
+            The number of bytes copied
+        """
+
+        pixels = np.frombuffer(surface.get_buffer(), dtype=np.uint8)
+        pixels = pixels.reshape(surface.get_height(), surface.get_pitch())
+        spans = changed_spans(surface, pixels, self.previous.reshape(pixels.shape))
+
+        pixels = pixels.reshape(-1)
+
+        written = 0
+        for start, stop in spans:
+            # copying into the mapping is all it takes, the driver sends the
+            # pages that were touched to the display
+            self.previous[start:stop] = pixels[start:stop]
+            written += stop - start
+
+        self.frames += 1
+        self.bytes_written += written
+        return written
+
+    def close(self):
+        # the frame view has to go before the mapping can be closed
+        self.previous = None
+        self.mapping.close()
+
+
+def open_framebuffer(
+    path: str, length: int
+) -> Union[FramebufferMap, FramebufferWriter]:
+    """
+    Open a framebuffer for writing frames of length bytes, mapped into memory
+    if possible and written through the file if not
+    """
+
+    try:
+        file = open(path, "r+b")
+        try:
+            framebuffer = FramebufferMap(file, length)
+        finally:
+            # the mapping stays valid without the file
+            file.close()
+    except (OSError, ValueError):
+        file = open(path, "wb")
+        atexit.register(file.close)
+        return FramebufferWriter(file)
+
+    atexit.register(framebuffer.close)
+    return framebuffer
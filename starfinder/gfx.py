@@ -2,9 +2,12 @@
 Some improved drawing functions
 """
 
+import functools
 import math
+import numpy as np
 import pygame
 import pygame.gfxdraw
+import pygame.surfarray
 
 
 def draw_aa_circle(
@@ -17,6 +20,38 @@ def draw_aa_circle(
     """
     An anti-aliased circle/ring
     """
+    target = circle_surface(
+        int(radius),
+        int(width),
+        tuple(color),
+        surface.get_bitsize(),
+    )
+    hw = target.get_width() // 2
+    hh = target.get_height() // 2
+
+    surface.blit(
+        target,
+        (
+            center[0] - hw,
+            center[1] - hh,
+        ),
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def circle_surface(
+    radius: int,
+    width: int,
+    color: tuple[int, int, int],
+    depth: int,
+) -> pygame.Surface:
+    """
+    A pre-rendered anti-aliased ring on a colour keyed surface, filled in when
+    width reaches the radius
+
+    Surfaces are cached by their arguments, circle_surface.cache_info() counts
+    the hits and misses so steady frames can be checked to not render any.
+    """
     target = pygame.surface.Surface(
         (radius * 2 + 2, radius * 2 + 2),
         pygame.SRCCOLORKEY,
@@ -35,20 +70,19 @@ def draw_aa_circle(
     )
 
     # Erase the inner circle to make it hollow
-    draw_aa_filled_circle(
-        target,
-        bg,
-        (hw, hh),
-        radius - width,
-    )
+    if width < radius:
+        draw_aa_filled_circle(
+            target,
+            bg,
+            (hw, hh),
+            radius - width,
+        )
 
-    surface.blit(
-        target,
-        (
-            center[0] - hw,
-            center[1] - hh,
-        ),
-    )
+    # convert once to the depth it's drawn on
+    converted = pygame.surface.Surface(target.get_size(), 0, depth)
+    converted.blit(target, (0, 0))
+    converted.set_colorkey(bg, pygame.RLEACCEL)
+    return converted
 
 
 def draw_aa_filled_circle(
@@ -80,3 +114,130 @@ def draw_aa_filled_circle(
         int(radius),
         color,
     )
+
+
+class DiscSprites:
+    """
+    Pre-rendered anti-aliased discs, for drawing many small circles with one
+    blit call
+
+    Each disc is rendered at a grid of sub-pixel offsets, so it lands where a
+    drawn circle would, and at a few brightness levels.
+    """
+
+    def __init__(
+        self,
+        radius: float,
+        depth: int,
+        color=(255, 255, 255),
+        offsets: int = 4,
+        levels: int = 8,
+        samples: int = 4,
+    ):
+        """
+        Args:
+            radius: disc radius in pixels
+            depth: bits per pixel of the surface the discs are drawn on
+            offsets: sub-pixel offsets rendered along each axis
+            levels: brightness levels rendered
+            samples: samples per pixel along each axis to anti-alias with
+        """
+
+        self.offsets = offsets
+        self.levels = levels
+
+        # distance from the pixel holding the center to the sprite's corner
+        self.half = math.ceil(radius)
+        size = 2 * self.half + 1
+
+        # sample positions inside the sprite, along one axis
+        steps = (np.arange(size * samples) + 0.5) / samples
+
+        # sprites[y offset][x offset][level]
+        self.sprites = []
+        for y_offset in range(offsets):
+            row = []
+            for x_offset in range(offsets):
+                center_x = self.half + (x_offset + 0.5) / offsets
+                center_y = self.half + (y_offset + 0.5) / offsets
+
+                # fraction of each pixel's samples inside the disc
+                inside = (
+                    (steps[:, np.newaxis] - center_x) ** 2
+                    + (steps[np.newaxis, :] - center_y) ** 2
+                ) <= radius**2
+                coverage = inside.reshape(size, samples, size, samples).mean(
+                    axis=(1, 3)
+                )
+
+                row.append(
+                    [
+                        self._render(coverage * (level + 1) / levels, color, depth)
+                        for level in range(levels)
+                    ]
+                )
+            self.sprites.append(row)
+
+    @staticmethod
+    def _render(coverage: np.ndarray, color, depth: int) -> pygame.Surface:
+        """
+        Turn a (width, height) array of coverage into a surface of the given
+        depth
+        """
+
+        pixels = np.round(coverage[..., np.newaxis] * color).astype(np.uint8)
+        rendered = pygame.surfarray.make_surface(pixels)
+
+        sprite = pygame.surface.Surface(rendered.get_size(), 0, depth)
+        sprite.blit(rendered, (0, 0))
+
+        # leave the corners around the disc transparent
+        sprite.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+        return sprite
+
+    def draw(
+        self,
+        surface: pygame.Surface,
+        points: np.ndarray,
+        brightness: np.ndarray,
+    ):
+        """
+        Draw a disc centered on each point
+
+        Args:
+            points: (N, 2) array of screen points
+            brightness: (N,) array of brightness from 0 to 1
+        """
+
+        corners = np.floor(points).astype(int)
+        offsets = ((points - corners) * self.offsets).astype(int)
+        offsets = np.clip(offsets, 0, self.offsets - 1)
+        levels = np.clip(np.round(brightness * self.levels).astype(int) - 1, 0, None)
+        levels = np.minimum(levels, self.levels - 1)
+        corners -= self.half
+
+        sequence = [
+            (self.sprites[y_offset][x_offset][level], corner)
+            for corner, (x_offset, y_offset), level in zip(
+                corners.tolist(),
+                offsets.tolist(),
+                levels.tolist(),
+            )
+        ]
+
+        # pygame-ce has a faster blit call for sequences that don't need the
+        # changed areas back
+        fblits = getattr(surface, "fblits", None)
+        if fblits is not None:
+            fblits(sequence)
+        else:
+            surface.blits(sequence, doreturn=False)
+
+
+@functools.lru_cache(maxsize=8)
+def disc_sprites(radius: float, depth: int) -> DiscSprites:
+    """
+    White disc sprites of a radius for surfaces of a depth, built on first use
+    """
+
+    return DiscSprites(radius, depth)
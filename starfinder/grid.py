@@ -1,109 +1,133 @@
-import itertools
 import math
+from typing import Optional
 import numpy as np
 from pygame import Surface
 import pygame
 from skyfield.units import Angle
 
-from starfinder.camera import Camera, HorizontalCoordinates
+from starfinder.camera import (
+    Camera,
+    HorizontalCoordinates,
+    horizontal_to_vectors,
+    on_screen_rect,
+)
+from starfinder.text import Text
 
 
 class Grid:
     def __init__(
         self,
-        font,
-        text_color,
-        bg_color,
+        text: Text,
         altitude_step: int = 15,
         azimuth_step: int = 15,
+        segment_length: float = 8,
+        max_segments: int = 96,
     ):
-        self.altitude_line_count = int(180 / altitude_step) - 1
-        self.azimuth_line_count = int(360 / azimuth_step)
+        """
+        Args:
+            text: renders the direction labels
+            altitude_step: degrees between altitude lines
+            azimuth_step: degrees between azimuth lines
+            segment_length: shortest screen length of each drawn segment in
+                pixels
+            max_segments: most segments drawn per frame, segments get longer
+                when more lines are visible
+        """
 
-        self.grid_points = []
-        self.horizon_points = []
+        self.altitudes = np.radians(np.arange(-90 + altitude_step, 90, altitude_step))
+        self.azimuths = np.radians(np.arange(0, 360, azimuth_step))
+        self.segment_length = segment_length
+        self.max_segments = max_segments
 
         self.direction_surfaces = [
-            (0, font.render("North", True, text_color, bg_color)),
-            (45, font.render("NE", True, text_color, bg_color)),
-            (90, font.render("East", True, text_color, bg_color)),
-            (135, font.render("SE", True, text_color, bg_color)),
-            (180, font.render("South", True, text_color, bg_color)),
-            (225, font.render("SW", True, text_color, bg_color)),
-            (270, font.render("West", True, text_color, bg_color)),
-            (315, font.render("NW", True, text_color, bg_color)),
+            (0, text.render("North")),
+            (45, text.render("NE")),
+            (90, text.render("East")),
+            (135, text.render("SE")),
+            (180, text.render("South")),
+            (225, text.render("SW")),
+            (270, text.render("West")),
+            (315, text.render("NW")),
         ]
 
-        # Generate grid points
-        total_altitude = 0
-        for altitude in range(-90 + altitude_step, 90, altitude_step):
-            total_azimuth = 0
-            total_altitude += 1
-            for azimuth in range(0, 360, azimuth_step):
-                total_azimuth += 1
-                hc = HorizontalCoordinates(
-                    altitude=Angle(
-                        degrees=altitude,
-                    ),
-                    azimuth=Angle(
-                        degrees=azimuth,
-                    ),
-                )
-                point = np.array(
-                    [
-                        math.sin(hc.azimuth.radians) * math.cos(-hc.altitude.radians),
-                        math.sin(-hc.altitude.radians),
-                        math.cos(hc.azimuth.radians) * math.cos(-hc.altitude.radians),
-                    ]
-                )
-
-                self.grid_points.append(point)
-                if altitude == 0:
-                    self.horizon_points.append(point)
-
-        self.grid_points = np.array(self.grid_points)
-        self.horizon_points = np.array(self.horizon_points)
+    def lines(self, camera: Camera) -> tuple[np.ndarray, list[int]]:
+        """
+        Sample the parts of every grid line inside the view
 
-    def render(self, camera: Camera, surface: Surface):
-        # continuous lines in the view
-        all_projected_points, valid_points_mask = camera.project_points(
-            self.grid_points
+        Lines are clipped to the cone around the screen (see Camera.view_cone)
+        and sampled so each segment is about segment_length pixels long. When
+        that would take more than max_segments, as zoomed out views show more
+        lines, the segments are lengthened to share max_segments between them.
+
+        Returns:
+            A tuple containing an (N, 3) array of horizontal rays along every
+            visible arc one after another, and the number of rays in each arc
+        """
+
+        direction, half_angle = camera.view_cone()
+        min_dot = math.cos(half_angle)
+
+        lowest, highest = self.altitudes[0], self.altitudes[-1]
+
+        # the visible arcs, and their total length in radians along the sky
+        altitude_arcs = []
+        azimuth_arcs = []
+        length = 0.0
+
+        for altitude in self.altitudes.tolist():
+            arc = altitude_arc(direction, altitude, min_dot)
+            if arc is None:
+                continue
+
+            altitude_arcs.append((altitude, *arc))
+            length += (arc[1] - arc[0]) * math.cos(altitude)
+
+        for azimuth in self.azimuths.tolist():
+            arc = azimuth_arc(direction, azimuth, min_dot)
+            if arc is None:
+                continue
+
+            # azimuth lines run between the lowest and highest altitude lines
+            start, stop = max(arc[0], lowest), min(arc[1], highest)
+            if start >= stop:
+                continue
+
+            azimuth_arcs.append((azimuth, start, stop))
+            length += stop - start
+
+        # rounding up can add a segment to each arc
+        budget = max(self.max_segments - len(altitude_arcs) - len(azimuth_arcs), 1)
+        step = max(camera.unproject_length(self.segment_length), length / budget)
+
+        altitudes = []
+        azimuths = []
+
+        for altitude, start, stop in altitude_arcs:
+            # azimuth turns faster than the arc length away from the horizon
+            samples = sample_arc(start, stop, step / math.cos(altitude))
+            altitudes.append(np.full(len(samples), altitude))
+            azimuths.append(samples)
+
+        for azimuth, start, stop in azimuth_arcs:
+            samples = sample_arc(start, stop, step)
+            altitudes.append(samples)
+            azimuths.append(np.full(len(samples), azimuth))
+
+        if not altitudes:
+            return np.empty((0, 3)), []
+
+        rays = horizontal_to_vectors(
+            np.concatenate(altitudes),
+            np.concatenate(azimuths),
         )
+        return rays, [len(samples) for samples in altitudes]
+
+    def render(self, camera: Camera, surface: Surface):
+        rays, counts = self.lines(camera)
 
-        for altitude_line_index in range(self.altitude_line_count):
-            altitude_line_index_start = altitude_line_index * self.azimuth_line_count
-            altitude_line_index_end = (
-                altitude_line_index + 1
-            ) * self.azimuth_line_count
-
-            altitude_line_points = all_projected_points[
-                altitude_line_index_start:altitude_line_index_end
-            ]
-            valid_altitude_line_points = valid_points_mask[
-                altitude_line_index_start:altitude_line_index_end
-            ]
-
-            render_valid_lines(
-                altitude_line_points,
-                valid_altitude_line_points,
-                surface,
-                wrap=True,
-            )
-
-        for azimuth_line_index in range(self.azimuth_line_count):
-            azimuth_line_points = all_projected_points[
-                azimuth_line_index :: self.azimuth_line_count
-            ]
-            valid_azimuth_line_points = valid_points_mask[
-                azimuth_line_index :: self.azimuth_line_count
-            ]
-
-            render_valid_lines(
-                azimuth_line_points,
-                valid_azimuth_line_points,
-                surface,
-                wrap=False,
-            )
+        # project every line at once, then draw each as one polyline
+        points, _ = camera.project_points(rays)
+        render_lines(surface, points[:, :2].tolist(), counts)
 
         # Render direction labels
         for angle, text_surface in self.direction_surfaces:
@@ -111,29 +135,132 @@ class Grid:
             if point:
                 text_rect = text_surface.get_rect().inflate(8, 8)
                 text_rect.center = point.to_tuple()
-                surface.blit(text_surface, text_rect)
-
-
-def pairwise_circle(iterable):
-    "s -> (s0,s1), (s1,s2), (s2, s3), ... (s<last>,s0)"
-    a, b = itertools.tee(iterable)
-    first_value = next(b, None)
-    return itertools.zip_longest(a, b, fillvalue=first_value)
-
-
-def render_valid_lines(
-    points: np.ndarray,
-    valid_points_mask: np.ndarray,
-    surface: Surface,
-    wrap: bool = False,
-):
-    lines = zip(points, valid_points_mask)
-    if wrap:
-        lines = pairwise_circle(lines)
-    else:
-        lines = itertools.pairwise(lines)
-
-    for (a_point, a_valid), (b_point, b_valid) in lines:
-        if not a_valid or not b_valid:
-            continue
-        pygame.draw.aaline(surface, (255, 255, 255), a_point[:2], b_point[:2])
+                if on_screen_rect(text_rect):
+                    surface.blit(text_surface, text_rect)
+
+
+def render_lines(surface: Surface, points: list[list[float]], counts: list[int]):
+    """
+    Draw consecutive runs of points as anti-aliased polylines
+
+    Args:
+        surface: surface to draw on
+        points: screen points of every line one after another
+        counts: the number of points in each line
+    """
+
+    # pygame 2.5's blended anti-aliased lines corrupt memory on 16 bit surfaces
+    # like the device's screen, even well inside the surface. The grid is drawn
+    # onto black, so overwriting rather than blending only differs where lines
+    # cross.
+    blend = surface.get_bytesize() > 2
+
+    start = 0
+    for count in counts:
+        stop = start + count
+        pygame.draw.aalines(
+            surface, (255, 255, 255), False, points[start:stop], blend
+        )
+        start = stop
+
+
+def altitude_arc(
+    direction: np.ndarray,
+    altitude: float,
+    min_dot: float,
+) -> Optional[tuple[float, float]]:
+    """
+    Find the azimuths where an altitude circle is inside a cone
+
+    Args:
+        direction: unit ray along the center of the cone
+        altitude: altitude of the circle in radians
+        min_dot: cosine of the cone's half angle
+
+    Returns:
+        The (start, stop) azimuths of the arc inside the cone in radians, or None
+        if the circle is outside of it
+    """
+
+    x, y, z = direction.tolist()
+
+    # the ray to each point of the circle dotted with the direction is
+    # radius * cos(azimuth - center) + offset
+    radius = math.cos(altitude) * math.hypot(x, z)
+    offset = -y * math.sin(altitude)
+    center = math.atan2(x, z)
+
+    return _arc(center, radius, offset, min_dot, math.pi)
+
+
+def azimuth_arc(
+    direction: np.ndarray,
+    azimuth: float,
+    min_dot: float,
+) -> Optional[tuple[float, float]]:
+    """
+    Find the altitudes where an azimuth half circle is inside a cone
+
+    Args:
+        direction: unit ray along the center of the cone
+        azimuth: azimuth of the half circle in radians
+        min_dot: cosine of the cone's half angle
+
+    Returns:
+        The (start, stop) altitudes of the arc inside the cone in radians, or
+        None if the half circle is outside of it
+    """
+
+    x, y, z = direction.tolist()
+
+    # the ray to each point of the half circle dotted with the direction is
+    # radius * cos(altitude - center)
+    along = x * math.sin(azimuth) + z * math.cos(azimuth)
+    radius = math.hypot(along, y)
+    center = math.atan2(-y, along)
+
+    arc = _arc(center, radius, 0, min_dot, math.pi)
+    if arc is None:
+        return None
+
+    # altitudes only run from pole to pole
+    start, stop = max(arc[0], -math.pi / 2), min(arc[1], math.pi / 2)
+    if start >= stop:
+        return None
+    return start, stop
+
+
+def _arc(
+    center: float,
+    radius: float,
+    offset: float,
+    min_dot: float,
+    max_half_width: float,
+) -> Optional[tuple[float, float]]:
+    """
+    Solve radius * cos(angle - center) + offset >= min_dot for the range of
+    angles around center
+    """
+
+    if radius < 1e-9:
+        # the circle is centered on the cone, it's all in or all out
+        if offset < min_dot:
+            return None
+        return center - max_half_width, center + max_half_width
+
+    cos_half_width = (min_dot - offset) / radius
+    if cos_half_width > 1:
+        return None
+
+    half_width = math.acos(max(cos_half_width, -1))
+    half_width = min(half_width, max_half_width)
+    return center - half_width, center + half_width
+
+
+def sample_arc(start: float, stop: float, step: float) -> np.ndarray:
+    """
+    Evenly sample an angle range, with both ends included, at most step apart
+    """
+
+    count = max(2, math.ceil((stop - start) / step) + 1)
+    return start + np.arange(count) * ((stop - start) / (count - 1))
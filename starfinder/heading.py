@@ -1,16 +1,16 @@
 import math
 import numpy as np
 from pygame import Surface
-import pygame
 
 from starfinder.camera import SCREEN_WIDTH, Camera
 from starfinder.gfx import draw_aa_circle
+from starfinder.text import text_renderer
 
 
 class Heading:
     def __init__(self):
-        font = pygame.font.Font(None, 20)
-        self.north_label = font.render("N", True, (255, 255, 255), (0, 0, 0))
+        text = text_renderer(20, (255, 255, 255), (0, 0, 0))
+        self.north_label = text.render("N")
 
     def render(self, camera: Camera, surface: Surface):
         size = 20
@@ -4,6 +4,12 @@ Modified from pimoroni's icm20948-python library
 Made changes so that
 * Use spi bypass on ICMS20948 so that the magnetometer can be read directly
 * Set the magnetometer to continuous mode
+* Optionally read the magnetometer through the ICM20948's I2C master, so all
+  nine axes come back in one block read
+* Optionally buffer accelerometer and gyro samples in the FIFO, and drain it
+  in bulk reads
+* Cache the full scale factors instead of reading them back on every sample
+* Count I2C transactions
 """
 
 import struct
@@ -23,6 +29,8 @@ ICM20948_I2C_SLV0_ADDR = 0x03
 ICM20948_I2C_SLV0_REG = 0x04
 ICM20948_I2C_SLV0_CTRL = 0x05
 ICM20948_I2C_SLV0_DO = 0x06
+ICM20948_I2C_SLV0_EN = 0x80
+ICM20948_I2C_SLV0_READ = 0x80
 ICM20948_EXT_SLV_SENS_DATA_00 = 0x3B
 
 ICM20948_GYRO_SMPLRT_DIV = 0x00
@@ -35,6 +43,8 @@ ICM20948_USER_CTRL = 0x03
 ICM20948_PWR_MGMT_1 = 0x06
 ICM20948_PWR_MGMT_2 = 0x07
 ICM20948_INT_PIN_CFG = 0x0F
+ICM20948_USER_CTRL_I2C_MST_EN = 0x20
+ICM20948_INT_PIN_CFG_BYPASS_EN = 0x02
 
 ICM20948_ACCEL_SMPLRT_DIV_1 = 0x10
 ICM20948_ACCEL_SMPLRT_DIV_2 = 0x11
@@ -47,6 +57,19 @@ ICM20948_GRYO_XOUT_H = 0x33
 ICM20948_TEMP_OUT_H = 0x39
 ICM20948_TEMP_OUT_L = 0x3A
 
+ICM20948_USER_CTRL_FIFO_EN = 0x40
+ICM20948_FIFO_EN_2 = 0x67
+ICM20948_FIFO_EN_2_ACCEL_GYRO = 0x1E
+ICM20948_FIFO_RST = 0x68
+ICM20948_FIFO_MODE = 0x69
+ICM20948_FIFO_MODE_SNAPSHOT = 0x01
+ICM20948_FIFO_COUNTH = 0x70
+ICM20948_FIFO_R_W = 0x72
+
+# bytes the FIFO holds, and bytes per accelerometer and gyro sample in it
+ICM20948_FIFO_SIZE = 512
+ICM20948_FIFO_PACKET_LENGTH = 12
+
 # Offset and sensitivity - defined in electrical characteristics, and TEMP_OUT_H/L of datasheet
 ICM20948_TEMPERATURE_DEGREES_OFFSET = 21
 ICM20948_TEMPERATURE_SENSITIVITY = 333.87
@@ -72,15 +95,36 @@ AK09916_CNTL2_MODE_CONT4 = 8
 AK09916_CNTL2_MODE_TEST = 16
 AK09916_CNTL3 = 0x32
 
+# ST1 through ST2, copied by the I2C master into EXT_SLV_SENS_DATA_00
+AK09916_BLOCK_LENGTH = AK09916_ST2 - AK09916_ST1 + 1
+
+# ACCEL_XOUT_H through the magnetometer block, accelerometer, gyro, temperature
+# and magnetometer registers are contiguous in bank 0
+SENSOR_BLOCK_LENGTH = (
+    ICM20948_EXT_SLV_SENS_DATA_00 - ICM20948_ACCEL_XOUT_H + AK09916_BLOCK_LENGTH
+)
+
+# magnetic flux density per LSB in uT, from section 3.3 of the AK09916 datasheet
+AK09916_SCALE = 0.15
+
+
+def _scale_magnetometer(data):
+    """Scale a magnetometer block, starting at ST1, to uT."""
+    # HXL through HZH follow ST1
+    x, y, z = struct.unpack_from("<hhh", data, 1)
+    return x * AK09916_SCALE, y * AK09916_SCALE, z * AK09916_SCALE
+
 
 class ICM20948:
     def write(self, reg, value):
         """Write byte to the sensor."""
+        self.transactions += 1
         self._bus.write_byte_data(self._addr, reg, value)
         time.sleep(0.0001)
 
     def read(self, reg):
         """Read byte from the sensor."""
+        self.transactions += 1
         return self._bus.read_byte_data(self._addr, reg)
 
     def trigger_mag_io(self):
@@ -91,8 +135,29 @@ class ICM20948:
 
     def read_bytes(self, reg, length=1):
         """Read byte(s) from the sensor."""
+        self.transactions += 1
         return self._bus.read_i2c_block_data(self._addr, reg, length)
 
+    def read_long_bytes(self, reg, length):
+        """Read any number of bytes from the sensor in one transaction.
+
+        SMBus block reads stop at 32 bytes, so this uses a combined write and
+        read message when the bus supports it.
+        """
+        if not hasattr(self._bus, "i2c_rdwr"):
+            data = []
+            for start in range(0, length, 32):
+                data += self.read_bytes(reg, min(32, length - start))
+            return data
+
+        from smbus2 import i2c_msg
+
+        write = i2c_msg.write(self._addr, [reg])
+        read = i2c_msg.read(self._addr, length)
+        self.transactions += 1
+        self._bus.i2c_rdwr(write, read)
+        return list(read)
+
     def bank(self, value):
         """Switch register self.bank."""
         if not self._bank == value:
@@ -101,15 +166,18 @@ class ICM20948:
 
     def mag_write(self, reg, value):
         """Write a byte to the slave magnetometer."""
+        self.transactions += 1
         self._bus.write_byte_data(AK09916_I2C_ADDR, reg, value)
         time.sleep(0.0001)
 
     def mag_read(self, reg):
         """Read a byte from the slave magnetometer."""
+        self.transactions += 1
         return self._bus.read_byte_data(AK09916_I2C_ADDR, reg)
 
     def mag_read_bytes(self, reg, length=1):
         """Read up to 24 bytes from the slave magnetometer."""
+        self.transactions += 1
         return self._bus.read_i2c_block_data(AK09916_I2C_ADDR, reg, length)
 
     def magnetometer_ready(self):
@@ -118,65 +186,166 @@ class ICM20948:
 
     def read_magnetometer_data(self, timeout=1.0):
         t_start = time.time()
-        while not self.magnetometer_ready():
+        while (data := self.poll_magnetometer_data()) is None:
             if time.time() - t_start > timeout:
                 raise RuntimeError("Timeout waiting for Magnetometer Ready")
             time.sleep(0.00001)
 
-        data = self.mag_read_bytes(AK09916_HXL, 6)
+        return data
 
-        # Read ST2 to confirm self.read finished,
-        # needed for continuous modes
-        self.mag_read(AK09916_ST2)
+    def poll_magnetometer_data(self):
+        """Read a new magnetometer sample (uT) without waiting for one.
 
-        x, y, z = struct.unpack("<hhh", bytearray(data))
+        Returns None straight away if the magnetometer hasn't measured since
+        the last read.
+        """
+        # ST1 through ST2 in one read, reading ST2 finishes the read, needed
+        # for continuous modes
+        data = bytearray(self.mag_read_bytes(AK09916_ST1, AK09916_BLOCK_LENGTH))
+        if not data[0] & AK09916_ST1_DRDY:
+            return None
 
-        # Scale for magnetic flux density "uT"
-        # from section 3.3 of the datasheet
-        # This value is constant
-        x *= 0.15
-        y *= 0.15
-        z *= 0.15
-
-        return x, y, z
+        return _scale_magnetometer(data)
 
     def read_accelerometer_gyro_data(self):
         self.bank(0)
         data = self.read_bytes(ICM20948_ACCEL_XOUT_H, 12)
 
-        ax, ay, az, gx, gy, gz = struct.unpack(">hhhhhh", bytearray(data))
+        return self._scale_accelerometer_gyro(
+            struct.unpack(">hhhhhh", bytearray(data))
+        )
 
-        self.bank(2)
+    def _scale_accelerometer_gyro(self, raw):
+        """Scale raw readings to gs and dps with the cached full scale ranges."""
+        ax, ay, az, gx, gy, gz = raw
+        gs = self._accelerometer_lsb
+        dps = self._gyro_lsb
+        return ax / gs, ay / gs, az / gs, gx / dps, gy / dps, gz / dps
+
+    def enable_i2c_master(self):
+        """Read the magnetometer through the I2C master instead of bypass.
+
+        The ICM20948 copies the magnetometer's ST1 to ST2 registers into
+        EXT_SLV_SENS_DATA_00 on every sample, so read_sensor_data() gets all
+        nine axes in one block read. The magnetometer can't be reached
+        directly (mag_read, read_magnetometer_data) after this.
+        """
+        self.bank(0)
+        self.write(
+            ICM20948_INT_PIN_CFG,
+            self.read(ICM20948_INT_PIN_CFG) & ~ICM20948_INT_PIN_CFG_BYPASS_EN,
+        )
 
-        # Read accelerometer full scale range and
-        # use it to compensate the self.reading to gs
-        scale = (self.read(ICM20948_ACCEL_CONFIG) & 0x06) >> 1
+        self.bank(3)
+        self.write(ICM20948_I2C_SLV0_ADDR, ICM20948_I2C_SLV0_READ | AK09916_I2C_ADDR)
+        self.write(ICM20948_I2C_SLV0_REG, AK09916_ST1)
+        self.write(ICM20948_I2C_SLV0_CTRL, ICM20948_I2C_SLV0_EN | AK09916_BLOCK_LENGTH)
 
-        # scale ranges from section 3.2 of the datasheet
-        gs = [16384.0, 8192.0, 4096.0, 2048.0][scale]
+        self.bank(0)
+        self.write(
+            ICM20948_USER_CTRL,
+            self.read(ICM20948_USER_CTRL) | ICM20948_USER_CTRL_I2C_MST_EN,
+        )
 
-        ax /= gs
-        ay /= gs
-        az /= gs
+        # give the master time to fetch the first sample
+        time.sleep(0.01)
 
-        # Read back the degrees per second rate and
-        # use it to compensate the self.reading to dps
-        scale = (self.read(ICM20948_GYRO_CONFIG_1) & 0x06) >> 1
+    def read_sensor_data(self):
+        """Read all nine axes in one transaction, needs enable_i2c_master().
 
-        # scale ranges from section 3.1 of the datasheet
-        dps = [131, 65.5, 32.8, 16.4][scale]
+        Returns accelerometer (gs), gyro (dps) and magnetometer (uT) readings,
+        the magnetometer reading is the last one it took.
+        """
+        self.bank(0)
+        data = bytearray(self.read_bytes(ICM20948_ACCEL_XOUT_H, SENSOR_BLOCK_LENGTH))
 
-        gx /= dps
-        gy /= dps
-        gz /= dps
+        accelerometer_gyro = self._scale_accelerometer_gyro(
+            struct.unpack_from(">hhhhhh", data)
+        )
 
-        return ax, ay, az, gx, gy, gz
+        offset = ICM20948_EXT_SLV_SENS_DATA_00 - ICM20948_ACCEL_XOUT_H
+        return accelerometer_gyro + _scale_magnetometer(data[offset:])
+
+    def enable_fifo(self):
+        """Buffer accelerometer and gyro samples in the FIFO.
+
+        Samples are added at the gyro's sample rate (gyro_sample_rate), which
+        needs the low pass filters on. The accelerometer's base rate differs
+        from the gyro's, so set it as close to the gyro's as it goes. Once the
+        FIFO is full new samples are dropped until it's read.
+        """
+        self.bank(0)
+        self.write(ICM20948_FIFO_EN_2, ICM20948_FIFO_EN_2_ACCEL_GYRO)
+        self.write(ICM20948_FIFO_MODE, ICM20948_FIFO_MODE_SNAPSHOT)
+        self.write(
+            ICM20948_USER_CTRL,
+            self.read(ICM20948_USER_CTRL) | ICM20948_USER_CTRL_FIFO_EN,
+        )
+        self.reset_fifo()
+
+    def reset_fifo(self):
+        """Empty the FIFO."""
+        self.bank(0)
+        self.write(ICM20948_FIFO_RST, 0x1F)
+        self.write(ICM20948_FIFO_RST, 0x00)
+
+    def read_fifo(self):
+        """Read every complete sample in the FIFO, needs enable_fifo().
+
+        Returns a list of accelerometer (gs) and gyro (dps) readings, oldest
+        first. If the FIFO filled up it's emptied and nothing is returned, the
+        samples in it may not line up with packets anymore.
+        """
+        self.bank(0)
+        count = struct.unpack(">H", bytearray(self.read_bytes(ICM20948_FIFO_COUNTH, 2)))
+        count = count[0] & 0x1FFF
+
+        if count > ICM20948_FIFO_SIZE - ICM20948_FIFO_PACKET_LENGTH:
+            self.reset_fifo()
+            return []
+
+        packets = count // ICM20948_FIFO_PACKET_LENGTH
+        if packets == 0:
+            return []
+
+        data = bytearray(
+            self.read_long_bytes(
+                ICM20948_FIFO_R_W,
+                packets * ICM20948_FIFO_PACKET_LENGTH,
+            )
+        )
+        return [
+            self._scale_accelerometer_gyro(raw)
+            for raw in struct.iter_unpack(">hhhhhh", data)
+        ]
+
+    def read_external_magnetometer_data(self):
+        """Read a new magnetometer sample (uT), needs enable_i2c_master().
+
+        Returns None straight away if the reading hasn't changed since the
+        last one returned. The I2C master reads the magnetometer faster than
+        it measures, so ST1's data ready bit only says whether the master's
+        last read was new.
+        """
+        self.bank(0)
+        data = bytearray(
+            self.read_bytes(ICM20948_EXT_SLV_SENS_DATA_00, AK09916_BLOCK_LENGTH)
+        )
+
+        # HXL through HZH follow ST1
+        measurement = data[1:7]
+        if measurement == self._last_magnetometer_measurement:
+            return None
+        self._last_magnetometer_measurement = measurement
+
+        return _scale_magnetometer(data)
 
     def set_accelerometer_sample_rate(self, rate=125):
         """Set the accelerometer sample rate in Hz."""
         self.bank(2)
         # 125Hz - 1.125 kHz / (1 + rate)
         rate = int((1125.0 / rate) - 1)
+        self.accelerometer_sample_rate = 1125.0 / (1 + rate)
         # TODO maybe use struct to pack and then write_bytes
         self.write(ICM20948_ACCEL_SMPLRT_DIV_1, (rate >> 8) & 0xFF)
         self.write(ICM20948_ACCEL_SMPLRT_DIV_2, rate & 0xFF)
@@ -188,20 +357,26 @@ class ICM20948:
         value |= {2: 0b00, 4: 0b01, 8: 0b10, 16: 0b11}[scale] << 1
         self.write(ICM20948_ACCEL_CONFIG, value)
 
+        # LSB per g, from section 3.2 of the datasheet
+        self._accelerometer_lsb = 32768.0 / scale
+
     def set_accelerometer_low_pass(self, enabled=True, mode=5):
         """Configure the accelerometer low pass filter."""
         self.bank(2)
-        value = self.read(ICM20948_ACCEL_CONFIG) & 0b10001110
+        value = self.read(ICM20948_ACCEL_CONFIG) & 0b11000110
         if enabled:
             value |= 0b1
-        value |= (mode & 0x07) << 4
+        # DLPFCFG is bits [5:3]
+        value |= (mode & 0x07) << 3
         self.write(ICM20948_ACCEL_CONFIG, value)
 
     def set_gyro_sample_rate(self, rate=125):
-        """Set the gyro sample rate in Hz."""
+        """Set the gyro sample rate in Hz, to the nearest rate it can run at."""
         self.bank(2)
-        # 125Hz sample rate - 1.125 kHz / (1 + rate)
-        rate = int((1125.0 / rate) - 1)
+        # 110Hz sample rate - 1.1 kHz / (1 + rate), the gyro's base rate is
+        # lower than the accelerometer's 1.125 kHz
+        rate = max(round((1100.0 / rate) - 1), 0)
+        self.gyro_sample_rate = 1100.0 / (1 + rate)
         self.write(ICM20948_GYRO_SMPLRT_DIV, rate)
 
     def set_gyro_full_scale(self, scale=250):
@@ -211,13 +386,17 @@ class ICM20948:
         value |= {250: 0b00, 500: 0b01, 1000: 0b10, 2000: 0b11}[scale] << 1
         self.write(ICM20948_GYRO_CONFIG_1, value)
 
+        # LSB per dps, from section 3.1 of the datasheet
+        self._gyro_lsb = {250: 131, 500: 65.5, 1000: 32.8, 2000: 16.4}[scale]
+
     def set_gyro_low_pass(self, enabled=True, mode=5):
         """Configure the gyro low pass filter."""
         self.bank(2)
-        value = self.read(ICM20948_GYRO_CONFIG_1) & 0b10001110
+        value = self.read(ICM20948_GYRO_CONFIG_1) & 0b11000110
         if enabled:
             value |= 0b1
-        value |= (mode & 0x07) << 4
+        # DLPFCFG is bits [5:3]
+        value |= (mode & 0x07) << 3
         self.write(ICM20948_GYRO_CONFIG_1, value)
 
     def read_temperature(self):
@@ -235,6 +414,21 @@ class ICM20948:
         self._bank = -1
         self._addr = i2c_addr
 
+        # I2C transactions so far
+        self.transactions = 0
+
+        # sample rates in Hz, what the chip actually runs at for the rates asked
+        # for, set by the setters
+        self.accelerometer_sample_rate = None
+        self.gyro_sample_rate = None
+
+        # the last magnetometer measurement read through the I2C master
+        self._last_magnetometer_measurement = None
+
+        # full scale ranges after reset, kept up to date by the setters
+        self._accelerometer_lsb = 16384.0
+        self._gyro_lsb = 131
+
         if i2c_bus is None:
             from smbus2 import SMBus
 
@@ -1,57 +1,108 @@
-from dataclasses import dataclass
 import math
 import threading
 import time
+from typing import Optional
 from .icm20948 import (
     ICM20948,
 )
+from .orientation_buffer import Orientation, OrientationBuffer
+from . import quaternion
 import numpy as np
 from smbus2 import SMBus
 import imufusion
 
-
-@dataclass
-class Orientation:
-    pitch: float
-    yaw: float
-    roll: float
+# rate the IMU samples the gyro at, buffered in its FIFO. The gyro runs at
+# 1.1 kHz divided by a whole number, this is 1.1 kHz / 5.
+SAMPLE_RATE = 220
+
+# rate the FIFO is drained at
+DRAIN_RATE = 50
+
+# degrees from true north to magnetic north, east is positive. This is for
+# Dayton, Ohio, where the GPS falls back to.
+MAGNETIC_DECLINATION = -5.5
+
+# from the IMU's axes to the camera's, the screen faces the IMU's -z
+SENSOR_TO_CAMERA = np.array([0.0, 1.0, 0.0, 0.0])
+
+# from the gyro's rates in radians to the camera's angular velocity. The
+# camera's orientation is the fusion's inverted, so it turns the other way.
+GYRO_TO_CAMERA = -quaternion.to_matrix(SENSOR_TO_CAMERA)
+
+# from horizontal rays (east, down, north) to the fusion's north, west, up,
+# turned from magnetic to true north about the vertical
+HORIZONTAL_TO_EARTH = quaternion.multiply(
+    np.array([0.5, -0.5, 0.5, -0.5]),
+    np.array(
+        [
+            math.cos(math.radians(MAGNETIC_DECLINATION) / 2),
+            0.0,
+            math.sin(math.radians(MAGNETIC_DECLINATION) / 2),
+            0.0,
+        ]
+    ),
+)
 
 
 class ImuManager(threading.Thread):
     running = False
 
-    previous_orientations = []
-
-    orientation_lock = threading.Lock()
-    orientation = Orientation(0, 0, 0)
-
     def __init__(self):
         super().__init__()
         self.daemon = True
 
+        # written only by this thread, read without locking by the render loop
+        self.orientations = OrientationBuffer()
+
         self.start()
 
-    def get_orientation(self) -> tuple[float, float, float]:
-        with self.orientation_lock:
-            return self.orientation
+    def get_orientation(self) -> Orientation:
+        """
+        The newest orientation
+        """
 
-    def run(self):
-        sample_rate = 30
+        sample = self.orientations.latest()
+        if sample is None:
+            return Orientation(np.array([1.0, 0.0, 0.0, 0.0]))
+        return sample.orientation
+
+    def predict_orientation(self, display_time: float) -> Optional[Orientation]:
+        """
+        The orientation expected at display_time, in time.monotonic() seconds
+        (see OrientationBuffer.predict)
+        """
 
+        return self.orientations.predict(display_time)
+
+    def run(self):
         try:
             bus = SMBus(1)
             time.sleep(1)
             imu = ICM20948(i2c_bus=bus, i2c_addr=0x69)
 
-            imu.set_accelerometer_sample_rate(sample_rate)
-            imu.set_gyro_sample_rate(sample_rate)
+            # the gyro paces the FIFO, the accelerometer can only get close to
+            # its rate
+            imu.set_gyro_sample_rate(SAMPLE_RATE)
+            imu.set_accelerometer_sample_rate(imu.gyro_sample_rate)
 
-            imu.set_accelerometer_low_pass(enabled=False)
-            imu.set_gyro_low_pass(enabled=False)
+            # the sample rates only apply with the low pass filters on, mode 3
+            # cuts off at 51.2 Hz for the gyro and 50.4 Hz for the accelerometer
+            # (tables 16 and 18 of the datasheet), lower adds lag before fusion
+            imu.set_accelerometer_low_pass(enabled=True, mode=3)
+            imu.set_gyro_low_pass(enabled=True, mode=3)
 
             imu.set_accelerometer_full_scale(16)
             imu.set_gyro_full_scale(2000)
 
+            # the magnetometer is read through the I2C master, the accelerometer
+            # and gyro are buffered in the FIFO
+            imu.enable_i2c_master()
+            imu.enable_fifo()
+
+            # the exact time between samples, 1.1 kHz / 5 = 220 Hz
+            sample_rate = imu.gyro_sample_rate
+            sample_interval = 1 / sample_rate
+
             ahrs = imufusion.Ahrs()
             ahrs.settings = imufusion.Settings(
                 imufusion.CONVENTION_NWU,
@@ -61,7 +112,7 @@ class ImuManager(threading.Thread):
                 10,
                 round(5.0 * sample_rate),
             )
-            offset = imufusion.Offset(sample_rate)
+            offset = imufusion.Offset(round(sample_rate))
 
             self.running = True
         except Exception as e:
@@ -69,36 +120,59 @@ class ImuManager(threading.Thread):
             self.running = False
             return
 
-        last_tick = time.monotonic()
         while True:
             current_tick = time.monotonic()
-            delta = current_tick - last_tick
-            last_tick = current_tick
-
-            mx, my, mz = imu.read_magnetometer_data()
-            mag = np.array([mx, my, mz])
-
-            ax, ay, az, gx, gy, gz = imu.read_accelerometer_gyro_data()
-            acc = np.array([ax, ay, az])
-            gyro = offset.update(np.array([gx, gy, gz]))
-
-            ahrs.update(
-                gyro,
-                acc,
-                mag,
-                delta,
-            )
-
-            euler = ahrs.quaternion.to_euler()
-            roll = math.radians(-euler[1])
-            pitch = math.radians(-euler[0]) + math.pi / 2
-            yaw = math.radians(euler[2]) + math.pi/ 2 + math.radians(magnetic_declination)
-
-            orientation = Orientation(pitch, yaw, roll)
-            with self.orientation_lock:
-                self.orientation = orientation
 
-            target_step_time = 1 / sample_rate
+            samples = imu.read_fifo()
+            if samples:
+                # None if the magnetometer hasn't measured since the last drain,
+                # it measures slower than the accelerometer and gyro
+                mag = imu.read_external_magnetometer_data()
+                if mag is not None:
+                    mag = np.array(mag)
+
+                for i, (ax, ay, az, gx, gy, gz) in enumerate(samples):
+                    acc = np.array([ax, ay, az])
+                    gyro = offset.update(np.array([gx, gy, gz]))
+
+                    # a new magnetometer reading goes with the newest sample
+                    if mag is not None and i == len(samples) - 1:
+                        ahrs.update(
+                            gyro,
+                            acc,
+                            mag,
+                            sample_interval,
+                        )
+                    else:
+                        ahrs.update_no_magnetometer(
+                            gyro,
+                            acc,
+                            sample_interval,
+                        )
+
+                # the fusion's quaternion turns the IMU's axes into the earth's,
+                # the camera's goes from horizontal rays to camera rays
+                fused = ahrs.quaternion
+                camera = quaternion.multiply(
+                    quaternion.multiply(
+                        SENSOR_TO_CAMERA,
+                        quaternion.conjugate(
+                            np.array([fused.w, fused.x, fused.y, fused.z])
+                        ),
+                    ),
+                    HORIZONTAL_TO_EARTH,
+                )
+
+                # the newest sample in the FIFO is from about when it was read,
+                # its gyro rates extrapolate the orientation without the noise
+                # of differencing fused orientations
+                self.orientations.publish(
+                    current_tick,
+                    Orientation(camera),
+                    np.dot(GYRO_TO_CAMERA, np.radians(gyro)),
+                )
+
+            target_step_time = 1 / DRAIN_RATE
             sleep_time = target_step_time - (time.monotonic() - current_tick)
 
             if sleep_time > 0:
@@ -0,0 +1,170 @@
+"""
+Placing object labels so they don't overlap
+
+Stars and bodies add a label for each object they draw, then the labels are
+placed most important first, each one below its object or else above it. A
+spatial hash of the placed labels keeps the overlap checks to the labels
+nearby. When every object has moved only a few pixels since the last layout,
+that layout is kept as it was.
+"""
+
+from dataclasses import dataclass
+from typing import Hashable, Optional
+
+from pygame import Rect, Surface
+
+from starfinder.camera import on_screen_rect
+
+# gap between an object's edge and its label
+LABEL_GAP = 6
+
+# size of the spatial hash cells in pixels
+CELL_SIZE = 32
+
+# how far, in pixels, objects can move before their labels are placed again
+REUSE_DISTANCE = 3
+
+
+@dataclass
+class Label:
+    key: Hashable
+    surface: Surface
+    x: float
+    y: float
+    clearance: float
+    priority: float
+
+    def rect(self, above: bool) -> Rect:
+        """
+        Where the label goes, under or over its object
+        """
+
+        rect = self.surface.get_rect()
+        rect.centerx = self.x
+        if above:
+            rect.bottom = self.y - self.clearance - LABEL_GAP
+        else:
+            rect.top = self.y + self.clearance + LABEL_GAP
+        return rect
+
+
+class Labels:
+    def __init__(self):
+        self.candidates = []
+
+        # the last layout, whether each label went above its object (or None if
+        # it was hidden) and where its object was when it was laid out
+        self.placements = {}
+        self.anchors = {}
+
+        # how many frames were laid out, and how many reused the last layout
+        self.layouts = 0
+        self.reuses = 0
+
+    def add(
+        self,
+        key: Hashable,
+        surface: Surface,
+        position: tuple[float, float],
+        clearance: float,
+        priority: float,
+    ):
+        """
+        Ask for a label this frame
+
+        Args:
+            key: identifies the labeled object between frames
+            position: screen position of the object
+            clearance: how far the label is kept from position, usually the
+                object's radius
+            priority: lower is placed first, like magnitudes
+        """
+
+        x, y = position
+        self.candidates.append(Label(key, surface, x, y, clearance, priority))
+
+    def render(self, surface: Surface):
+        """
+        Place and draw this frame's labels
+        """
+
+        candidates, self.candidates = self.candidates, []
+
+        if self.can_reuse(candidates):
+            self.reuses += 1
+        else:
+            self.layouts += 1
+            self.placements = self.layout(candidates)
+
+            # drift is measured from here until the next layout
+            self.anchors = {label.key: (label.x, label.y) for label in candidates}
+
+        sequence = []
+        for label in candidates:
+            above = self.placements[label.key]
+            if above is not None:
+                sequence.append((label.surface, label.rect(above)))
+
+        surface.blits(sequence, doreturn=False)
+
+    def can_reuse(self, candidates: list[Label]) -> bool:
+        """
+        Whether the last layout still fits, the same objects are labeled and
+        none moved more than REUSE_DISTANCE since it was laid out
+        """
+
+        if len(candidates) != len(self.anchors):
+            return False
+
+        for label in candidates:
+            anchor = self.anchors.get(label.key)
+            if anchor is None:
+                return False
+            if (
+                abs(label.x - anchor[0]) > REUSE_DISTANCE
+                or abs(label.y - anchor[1]) > REUSE_DISTANCE
+            ):
+                return False
+
+        return True
+
+    @staticmethod
+    def layout(candidates: list[Label]) -> dict[Hashable, Optional[bool]]:
+        """
+        Place labels most important first, hiding any that would overlap one
+        already placed or be entirely off the visible screen
+
+        Returns:
+            Whether each label goes above its object, or None if it's hidden
+        """
+
+        # placed rects, by every cell they touch
+        cells = {}
+
+        placements = {}
+        for label in sorted(candidates, key=lambda label: label.priority):
+            placements[label.key] = None
+
+            for above in (False, True):
+                rect = label.rect(above)
+                if not on_screen_rect(rect):
+                    continue
+
+                touched = [
+                    (x, y)
+                    for x in range(rect.left // CELL_SIZE, rect.right // CELL_SIZE + 1)
+                    for y in range(rect.top // CELL_SIZE, rect.bottom // CELL_SIZE + 1)
+                ]
+                if any(
+                    rect.colliderect(placed)
+                    for cell in touched
+                    for placed in cells.get(cell, ())
+                ):
+                    continue
+
+                for cell in touched:
+                    cells.setdefault(cell, []).append(rect)
+                placements[label.key] = above
+                break
+
+        return placements
@@ -1,38 +1,55 @@
 import math
 import pygame
 import os
-import atexit
 import time
+from typing import TYPE_CHECKING
 
-from skyfield.api import load, N, E, wgs84
-from skyfield.data import hipparcos
-from gpiozero import Button, DigitalOutputDevice
-
-from starfinder.bodies import Bodies
+# Only the modules needed for the loading screen are imported here, everything
+# else is imported once the loading screen is up (see benchmarks/import_budget.py)
 from starfinder.camera import (
     PHYSICAL_FOV,
     SCREEN_HEIGHT,
     SCREEN_WIDTH,
     Camera,
 )
-from starfinder.fps import Fps
-from starfinder.gps import GpsManager
-from starfinder.grid import Grid
-from starfinder.imu import ImuManager
-from starfinder.heading import Heading
-from starfinder.stars import Stars
-from starfinder.zoom_button import ZoomButton
+from starfinder.framebuffer import open_framebuffer
+from starfinder.text import text_renderer
+
+if TYPE_CHECKING:
+    from starfinder.sky_loader import SkySnapshot
 
 # Check if we are running on the device
 IS_ON_DEVICE = os.path.exists("/dev/fb1")
 
+# seconds from reading the orientation until the frame is on the display,
+# rendering plus the transfer to the LCD. The camera is aimed that far ahead,
+# 0 turns lag compensation off.
+DISPLAY_LATENCY = 0.04
+
 if IS_ON_DEVICE:
     # Open the framebuffer
     # on the pi, we write directly to the framebuffer to avoid the overhead of X11.
     # I had trouble getting pygame/SDL to work with directfb or fbdev, so this is a
-    # workaround.
-    fb = open("/dev/fb1", "wb")
-    atexit.register(fb.close)
+    # workaround. It's memory mapped when possible, 16 bits per pixel.
+    fb = open_framebuffer("/dev/fb1", SCREEN_WIDTH * SCREEN_HEIGHT * 2)
+
+
+def setup_buttons():
+    """
+    Set up the physical zoom buttons
+
+    Returns:
+        A tuple containing the zoom in and zoom out buttons, or None when not
+        running on the device
+    """
+
+    if not IS_ON_DEVICE:
+        return None, None
+
+    from gpiozero import Button, DigitalOutputDevice
+
+    # the outputs stay powered for as long as they are referenced
+    global out_zoom_in, out_zoom_out
 
     # enable some power for the buttons. Yeah, this is weird to do
     # instead of powering the buttons directly, but I'm cramped for
@@ -44,9 +61,8 @@ if IS_ON_DEVICE:
 
     zoom_in = Button(1, pull_up=False)
     zoom_out = Button(12, pull_up=False)
-else:
-    zoom_in = None
-    zoom_out = None
+
+    return zoom_in, zoom_out
 
 
 class Main:
@@ -66,9 +82,9 @@ class Main:
             pygame.display.set_caption("Starfinder")
 
         # Define font and colors
-        self.font = pygame.font.Font(None, 36)
         self.text_color = (255, 255, 255)
         self.bg_color = (0, 0, 0)
+        self.text = text_renderer(36, self.text_color, self.bg_color)
 
         # Set up the clock
         self.clock = pygame.time.Clock()
@@ -76,6 +92,21 @@ class Main:
 
         self.display_progress(0)
 
+        # The loading screen is up, now bring in the heavy modules
+        from skyfield.api import load
+        from skyfield.data import hipparcos
+
+        from starfinder.catalog import load_catalog
+        from starfinder.fps import Fps
+        from starfinder.gps import GpsManager
+        from starfinder.grid import Grid
+        from starfinder.heading import Heading
+        from starfinder.labels import Labels
+        from starfinder.imu import ImuManager
+        from starfinder.scheduler import RenderScheduler
+        from starfinder.sky_loader import SkyLoader
+        from starfinder.zoom_button import ZoomButton
+
         # Initialize GPS and IMU
         self.gps = GpsManager()
         self.imu = ImuManager()
@@ -83,22 +114,36 @@ class Main:
         # Load the star data
         self.eph = load("de421.bsp")
 
-        with load.open(hipparcos.URL) as f:
-            self.hpc = hipparcos.load_dataframe(f)
+        self.catalog = load_catalog(load, hipparcos.URL)
 
+        self.zoom_levels = [
+            PHYSICAL_FOV,
+            math.radians(60),
+            math.radians(120),
+        ]
+
+        # sky data is prepared in the background after the first load
         self.coordinates = None
         self.last_location_update = 0
+        self.sky = None
+        self.sky_loader = SkyLoader(self.prepare_info)
         self.update_location()
-        self.prepare_info()
 
         # self.camera = Camera(0, math.radians(180), 0, math.radians(60))
         self.camera = Camera(0, math.radians(180), 0, math.radians(60))
 
-        self.grid = Grid(self.font, self.text_color, self.bg_color)
+        self.grid = Grid(self.text)
+        self.labels = Labels()
         self.heading = Heading()
         self.fps = Fps()
 
+        # only render when something visibly changed, judged by the IMU's
+        # newest orientation rather than the extrapolated one when it's running
+        self.scheduler = RenderScheduler()
+        self.measured_orientation = None
+
         # keep track of input
+        zoom_in, zoom_out = setup_buttons()
         self.zoom_in = ZoomButton(
             pygame.K_UP,
             zoom_in,
@@ -112,27 +157,22 @@ class Main:
             self.zoom_out_double_tap,
         )
 
-        self.zoom_levels = [
-            PHYSICAL_FOV,
-            math.radians(60),
-            math.radians(120),
-        ]
-
         while True:
             self.tick_input()
-            self.render()
-            self.delta = self.clock.tick(30) / 1000
+            self.scheduler.run(
+                self.camera, self.sky, self.render, self.measured_orientation
+            )
+            self.delta = self.clock.tick(self.scheduler.rate) / 1000
 
-    def update_camera(self, pitch=None, yaw=None, roll=None, fov=None):
+    def update_camera(
+        self, pitch=None, yaw=None, roll=None, fov=None, quaternion=None
+    ):
         """
         Update the camera orientation
         """
 
-        self.camera = Camera(
-            pitch if pitch is not None else self.camera.pitch,
-            yaw if yaw is not None else self.camera.yaw,
-            roll if roll is not None else self.camera.roll,
-            fov if fov is not None else self.camera.fov,
+        self.camera.update(
+            pitch=pitch, yaw=yaw, roll=roll, fov=fov, quaternion=quaternion
         )
 
     def get_closest_zoom_level_index(self):
@@ -203,14 +243,31 @@ class Main:
                 fov=self.camera.fov + math.radians(15) * self.delta,
             )
 
-        # Update the camera orientation from the IMU
+        # Update the camera orientation from the IMU, predicted for when the
+        # frame reaches the display
         if self.imu.running:
-            orientation = self.imu.get_orientation()
-            self.update_camera(
-                pitch=orientation.pitch,
-                yaw=orientation.yaw,
-                roll=orientation.roll,
+            self.measured_orientation = self.imu.get_orientation().quaternion
+            orientation = self.imu.predict_orientation(
+                time.monotonic() + DISPLAY_LATENCY
             )
+            if orientation is not None:
+                self.update_camera(quaternion=orientation.quaternion)
+
+        # Swap in freshly prepared sky data
+        sky = self.sky_loader.take()
+        if sky is not None:
+            print(f"Swapped in new sky data, the old data was {self.sky.age:.0f} s old")
+            self.sky = sky
+
+        # Follow the earth's rotation
+        self.sky.sky_frame.update()
+
+        # Rebuild the table of body positions before it runs out
+        if (
+            time.time() > self.sky.bodies.end - 60 * 60
+            and self.sky_loader.pending_for == 0
+        ):
+            self.sky_loader.request(self.coordinates)
 
         # Update the GPS
         if time.monotonic() - self.last_location_update > 15:
@@ -224,10 +281,14 @@ class Main:
         # Clear the screen
         self.screen.fill((0, 0, 0))
 
+        # use one snapshot for the whole frame
+        sky = self.sky
+
         # Render
         self.grid.render(self.camera, self.screen)
-        self.stars.render(self.camera, self.screen)
-        self.bodies.render(self.camera, self.screen)
+        sky.stars.render(self.camera, self.screen, sky.sky_frame.matrix, self.labels)
+        sky.bodies.render(self.camera, self.screen, sky.sky_frame.matrix, self.labels)
+        self.labels.render(self.screen)
         self.fps.render(self.screen, self.clock)
         self.heading.render(self.camera, self.screen)
 
@@ -253,13 +314,26 @@ class Main:
         # Update and prepare info if the location has changed significantly
         if coordinates_diff > 1.0:
             self.coordinates = coordinates
-            self.prepare_info()
 
-    def prepare_info(self):
+            if self.sky is None:
+                # nothing to show yet, so load while the loading screen is up
+                self.sky = self.prepare_info(coordinates)
+            else:
+                # keep rendering the current sky until the new one is ready
+                self.sky_loader.request(coordinates)
+
+    def prepare_info(self, coordinates: tuple[float, float]) -> "SkySnapshot":
         """
         Load the data for display
         """
 
+        from skyfield.api import load, N, E, wgs84
+
+        from starfinder.bodies import TABLE_INTERVAL, Bodies
+        from starfinder.sky_frame import SkyFrame
+        from starfinder.sky_loader import SkySnapshot
+        from starfinder.stars import Stars
+
         earth = self.eph["earth"]
 
         # location
@@ -267,13 +341,26 @@ class Main:
         t = ts.now()
 
         location = earth + wgs84.latlon(
-            self.coordinates[0] * N,
-            self.coordinates[1] * E,
+            coordinates[0] * N,
+            coordinates[1] * E,
+        )
+
+        # the rotation from the fixed sky to the horizon, kept up to date as
+        # the earth turns
+        sky_frame = SkyFrame(
+            ts,
+            math.radians(coordinates[0]),
+            math.radians(coordinates[1]),
         )
-        observer = location.at(t)
 
-        self.bodies = Bodies(self.eph, observer)
-        self.stars = Stars(self.hpc, observer)
+        return SkySnapshot(
+            coordinates=coordinates,
+            sky_frame=sky_frame,
+            stars=Stars.from_catalog(self.catalog, t, self.zoom_levels),
+            # start the table a little in the past so it covers the time
+            # until the snapshot is swapped in
+            bodies=Bodies(self.eph, location, ts, time.time() - TABLE_INTERVAL),
+        )
 
     def display_progress(self, pct):
         """
@@ -281,7 +368,7 @@ class Main:
         """
 
         # TODO: loading progress?
-        text = self.font.render("Loading...", True, self.text_color, self.bg_color)
+        text = self.text.render("Loading...")
         text_rect = text.get_rect()
         text_rect.center = self.screen.get_rect().center
         self.screen.blit(text, text_rect)
@@ -291,8 +378,7 @@ class Main:
 
     def refresh(self):
         if IS_ON_DEVICE:
-            fb.seek(0)
-            fb.write(self.screen.get_buffer())
-            fb.flush()
+            # only the rows that changed are written
+            fb.write(self.screen)
         else:
             pygame.display.flip()
@@ -0,0 +1,213 @@
+"""
+Orientation samples shared between the IMU thread and the render loop
+
+The IMU thread is the only writer. It fills the next slot of a ring and then
+publishes it by bumping a counter, so readers never wait for it and only ever
+see whole samples. The render loop asks for the orientation at the time its
+frame will reach the display, extrapolated from the newest sample with the
+angular velocity the gyro measured.
+
+Orientations are quaternions from horizontal rays to camera rays (see
+starfinder.quaternion), what Camera.transformation_matrix rotates by.
+
+Predictions are checked by the writer once samples for their time arrive, so
+the error with and without extrapolation can be compared without slowing the
+render loop.
+"""
+
+import collections
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from starfinder import quaternion
+
+# samples kept, enough to look back over the predictions being checked
+BUFFER_SIZE = 64
+
+# furthest ahead, in seconds, a prediction extrapolates
+MAX_PREDICTION = 0.1
+
+# seconds between printed prediction metrics
+REPORT_INTERVAL = 60.0
+
+
+@dataclass(frozen=True)
+class Orientation:
+    # unit (w, x, y, z) quaternion from horizontal rays to camera rays
+    quaternion: np.ndarray
+
+
+@dataclass(frozen=True)
+class OrientationSample:
+    # time.monotonic() of the newest IMU sample behind the orientation
+    timestamp: float
+    orientation: Orientation
+
+    # angular velocity as a rotation vector per second, in radians
+    velocity: np.ndarray
+
+
+def orientation_difference(a: Orientation, b: Orientation) -> float:
+    """
+    The angle in radians between two orientations
+    """
+
+    return quaternion.angle_between(a.quaternion, b.quaternion)
+
+
+def extrapolate(sample: OrientationSample, delta: float) -> Orientation:
+    """
+    Where a sample's orientation is after delta seconds at its angular velocity
+    """
+
+    turn = quaternion.from_rotation_vector(sample.velocity * delta)
+    return Orientation(quaternion.multiply(turn, sample.orientation.quaternion))
+
+
+class OrientationBuffer:
+    def __init__(self, size: int = BUFFER_SIZE):
+        self.samples: list[Optional[OrientationSample]] = [None] * size
+
+        # samples published so far, the newest is at (count - 1) % size
+        self.count = 0
+
+        # predictions waiting for samples at their time, as (display time,
+        # prediction, newest orientation). The reader appends and counts them,
+        # the writer pops and checks them, a deque is safe for that.
+        self.pending = collections.deque(maxlen=size)
+        self.predictions = 0
+        self.horizon = 0.0
+
+        # totals of the predictions checked, only used by the writer
+        self.checked = 0
+        self.error = 0.0
+        self.uncompensated_error = 0.0
+        self.last_report = time.monotonic()
+
+    def publish(
+        self, timestamp: float, orientation: Orientation, velocity: np.ndarray
+    ):
+        """
+        Add a sample, only ever called from one thread
+
+        Args:
+            timestamp: time.monotonic() of the sample
+            orientation: the orientation at that time
+            velocity: the angular velocity the gyro measured, as a rotation
+                vector per second in radians applied before the orientation
+                (see extrapolate)
+        """
+
+        self.samples[self.count % len(self.samples)] = OrientationSample(
+            timestamp, orientation, velocity
+        )
+
+        # publishing is the single assignment, after the slot is filled
+        self.count += 1
+
+        self.check_predictions()
+
+    def latest(self) -> Optional[OrientationSample]:
+        """
+        The newest sample, or None before the first
+        """
+
+        count = self.count
+        if count == 0:
+            return None
+        return self.samples[(count - 1) % len(self.samples)]
+
+    def at(self, timestamp: float) -> Optional[Orientation]:
+        """
+        The orientation at a time between two samples, or None if the samples
+        around it aren't in the buffer
+        """
+
+        count = self.count
+        later = None
+        for i in range(count - 1, max(count - len(self.samples), 0) - 1, -1):
+            sample = self.samples[i % len(self.samples)]
+            if sample.timestamp == timestamp:
+                return sample.orientation
+            if sample.timestamp < timestamp:
+                if later is None:
+                    return None
+
+                fraction = (timestamp - sample.timestamp) / (
+                    later.timestamp - sample.timestamp
+                )
+                return Orientation(
+                    quaternion.slerp(
+                        sample.orientation.quaternion,
+                        later.orientation.quaternion,
+                        fraction,
+                    )
+                )
+            later = sample
+
+        return None
+
+    def predict(self, display_time: float) -> Optional[Orientation]:
+        """
+        The orientation expected at display_time (in time.monotonic() seconds),
+        extrapolated from the newest sample by at most MAX_PREDICTION
+
+        Returns:
+            The orientation, or None before the first sample
+        """
+
+        sample = self.latest()
+        if sample is None:
+            return None
+
+        delta = min(max(display_time - sample.timestamp, 0), MAX_PREDICTION)
+        orientation = extrapolate(sample, delta)
+
+        self.predictions += 1
+        self.horizon += delta
+        self.pending.append((display_time, orientation, sample.orientation))
+
+        return orientation
+
+    def check_predictions(self):
+        """
+        Compare predictions with the samples that arrived for their time, and
+        print the totals every REPORT_INTERVAL. Called by the writer.
+        """
+
+        latest = self.latest()
+        while self.pending and latest and self.pending[0][0] <= latest.timestamp:
+            display_time, predicted, uncompensated = self.pending.popleft()
+
+            actual = self.at(display_time)
+            if actual is None:
+                continue
+
+            self.checked += 1
+            self.error += orientation_difference(predicted, actual)
+            self.uncompensated_error += orientation_difference(uncompensated, actual)
+
+        now = time.monotonic()
+        if now - self.last_report >= REPORT_INTERVAL:
+            self.last_report = now
+            print(self.summary())
+
+    def summary(self) -> str:
+        """
+        How far ahead predictions reached, and how far off they were with and
+        without extrapolation
+        """
+
+        horizon = self.horizon / max(self.predictions, 1) * 1000
+        checked = max(self.checked, 1)
+
+        return (
+            f"predicted {self.predictions} orientations {horizon:.0f} ms ahead,"
+            f" off by {math.degrees(self.error / checked):.2f}° against"
+            f" {math.degrees(self.uncompensated_error / checked):.2f}°"
+            " without prediction"
+        )
@@ -0,0 +1,104 @@
+"""
+Unit quaternions as (w, x, y, z) arrays
+
+Orientations are kept as quaternions from the IMU to the camera, they're
+turned into a rotation matrix without any trig and don't lock up when the
+device points at the zenith like Euler angles do.
+"""
+
+import math
+
+import numpy as np
+
+
+def multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    The rotation b followed by a
+    """
+
+    aw, ax, ay, az = a
+    bw, bx, by, bz = b
+    return np.array(
+        [
+            aw * bw - ax * bx - ay * by - az * bz,
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+        ]
+    )
+
+
+def conjugate(q: np.ndarray) -> np.ndarray:
+    """
+    The inverse rotation
+    """
+
+    return q * np.array([1, -1, -1, -1])
+
+
+def to_matrix(q: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    The rotation matrix of a unit quaternion, written into out if given
+    """
+
+    w, x, y, z = q
+    if out is None:
+        out = np.empty((3, 3))
+
+    out[0, 0] = 1 - 2 * (y * y + z * z)
+    out[0, 1] = 2 * (x * y - w * z)
+    out[0, 2] = 2 * (x * z + w * y)
+    out[1, 0] = 2 * (x * y + w * z)
+    out[1, 1] = 1 - 2 * (x * x + z * z)
+    out[1, 2] = 2 * (y * z - w * x)
+    out[2, 0] = 2 * (x * z - w * y)
+    out[2, 1] = 2 * (y * z + w * x)
+    out[2, 2] = 1 - 2 * (x * x + y * y)
+    return out
+
+
+def from_rotation_vector(vector: np.ndarray) -> np.ndarray:
+    """
+    The rotation about a vector's direction by its length in radians
+    """
+
+    angle = math.sqrt(np.dot(vector, vector))
+    if angle < 1e-12:
+        return np.array([1.0, 0.0, 0.0, 0.0])
+
+    return np.concatenate(
+        [[math.cos(angle / 2)], vector * (math.sin(angle / 2) / angle)]
+    )
+
+
+def to_rotation_vector(q: np.ndarray) -> np.ndarray:
+    """
+    The axis of a rotation scaled by its angle in radians, the short way round
+    """
+
+    # q and -q are the same rotation, take the one turning less than half a turn
+    if q[0] < 0:
+        q = -q
+
+    length = math.sqrt(np.dot(q[1:], q[1:]))
+    if length < 1e-12:
+        return np.zeros(3)
+
+    return q[1:] * (2 * math.atan2(length, q[0]) / length)
+
+
+def angle_between(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    The angle in radians of the rotation from one orientation to another
+    """
+
+    return 2 * math.acos(min(abs(float(np.dot(a, b))), 1))
+
+
+def slerp(a: np.ndarray, b: np.ndarray, fraction: float) -> np.ndarray:
+    """
+    The orientation a fraction of the way from a to b
+    """
+
+    step = to_rotation_vector(multiply(b, conjugate(a)))
+    return multiply(from_rotation_vector(step * fraction), a)
@@ -0,0 +1,171 @@
+"""
+Deciding when to render
+
+A frame is rendered when the view has moved by more than MOTION_THRESHOLD
+pixels since the last frame, when the sky data was swapped, or at least every
+REFRESH_INTERVAL so slow changes (the earth turning, the frame rate) still show.
+Once the view has been still for IDLE_AFTER the main loop slows to IDLE_RATE,
+and it's back to FULL_RATE as soon as the view moves again.
+"""
+
+import math
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from starfinder import quaternion
+from starfinder.camera import HALF_SCREEN_WIDTH, SCREEN_RADIUS, Camera
+
+# main loop rates in frames per second, the idle rate only polls input and the
+# IMU so motion is still picked up quickly
+FULL_RATE = 30
+IDLE_RATE = 10
+
+# how far, in pixels, the view can move before it's rendered again. With the
+# IMU this is measured on its newest orientation rather than the camera's
+# extrapolated one, extrapolating 40 ms ahead turns sensor noise well under a
+# pixel into a pixel or more.
+MOTION_THRESHOLD = 1.0
+
+# seconds between frames when nothing moves
+REFRESH_INTERVAL = 1.0
+
+# seconds without motion before the loop slows down
+IDLE_AFTER = 2.0
+
+# seconds between printed metrics
+REPORT_INTERVAL = 60.0
+
+
+class RenderScheduler:
+    def __init__(self):
+        # the camera, measured orientation and sky of the last rendered frame
+        self.matrix = None
+        self.fov = None
+        self.revision = None
+        self.orientation = None
+        self.sky = None
+
+        self.last_render = -math.inf
+        self.last_motion = -math.inf
+        self.last_report = time.monotonic()
+
+        # metrics, render_time is CPU seconds the render loop's thread spent
+        # rendering, without the IMU and sky loader threads
+        self.started = time.monotonic()
+        self.process_time_started = time.process_time()
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.render_time = 0.0
+
+    @property
+    def rate(self) -> int:
+        """
+        How fast the main loop should run
+        """
+
+        if time.monotonic() - self.last_motion < IDLE_AFTER:
+            return FULL_RATE
+        return IDLE_RATE
+
+    def movement(
+        self, camera: Camera, orientation: Optional[np.ndarray] = None
+    ) -> float:
+        """
+        How far, in pixels, any point on the screen has moved since the last
+        rendered frame at most
+
+        Args:
+            camera: the camera about to be rendered
+            orientation: the measured (w, x, y, z) quaternion the camera's
+                orientation was extrapolated from, if any. Rotation is measured
+                on it instead of the camera.
+        """
+
+        if self.matrix is None:
+            return math.inf
+        if camera.revision == self.revision:
+            return 0
+
+        # the angle of the rotation between the two orientations, no ray moves
+        # further than that
+        if orientation is not None and self.orientation is not None:
+            angle = quaternion.angle_between(orientation, self.orientation)
+        else:
+            relative = np.dot(camera.transformation_matrix, self.matrix.T)
+            angle = math.acos(min(max((np.trace(relative) - 1) / 2, -1), 1))
+        rotation = angle * math.pi / camera.fov * HALF_SCREEN_WIDTH
+
+        # zooming moves the edge of the screen the most
+        zoom = SCREEN_RADIUS * abs(self.fov / camera.fov - 1)
+
+        return rotation + zoom
+
+    def run(
+        self,
+        camera: Camera,
+        sky,
+        render: Callable[[], None],
+        orientation: Optional[np.ndarray] = None,
+    ) -> bool:
+        """
+        Call render if the frame has visibly changed or is due for a refresh,
+        see movement for orientation
+
+        Returns:
+            Whether the frame was rendered
+        """
+
+        now = time.monotonic()
+
+        moved = self.movement(camera, orientation) > MOTION_THRESHOLD
+        if moved:
+            self.last_motion = now
+
+        if moved or sky is not self.sky or now - self.last_render >= REFRESH_INTERVAL:
+            start = time.thread_time()
+            render()
+            self.render_time += time.thread_time() - start
+
+            self.matrix = camera.transformation_matrix.copy()
+            self.fov = camera.fov
+            self.revision = camera.revision
+            self.orientation = orientation
+            self.sky = sky
+
+            self.last_render = now
+            self.frames_rendered += 1
+            rendered = True
+        else:
+            self.frames_skipped += 1
+            rendered = False
+
+        if now - self.last_report >= REPORT_INTERVAL:
+            self.last_report = now
+            print(self.summary())
+
+        return rendered
+
+    def summary(self) -> str:
+        """
+        Frame counts and CPU use since the scheduler started, and the age of
+        the sky data last rendered. CPU per frame is the render loop's alone,
+        CPU overall is every thread's.
+        """
+
+        elapsed = time.monotonic() - self.started
+        process_time = time.process_time() - self.process_time_started
+        per_frame = self.render_time / max(self.frames_rendered, 1) * 1000
+
+        summary = (
+            f"rendered {self.frames_rendered} frames, skipped {self.frames_skipped}"
+            f" in {elapsed:.0f} s, {per_frame:.1f} ms CPU per frame,"
+            f" {process_time / max(elapsed, 1e-9):.0%} CPU overall"
+        )
+
+        # how stale the sky data on screen is
+        if self.sky is not None:
+            summary += f", sky data {self.sky.age:.0f} s old"
+
+        return summary
@@ -0,0 +1,145 @@
+"""
+Rotation between fixed sky (ICRS) rays and the observer's horizon
+
+Stars and bodies are stored as ICRS unit rays, which barely change through the
+night. The Earth's rotation is applied by one 3x3 rotation built from the local
+sidereal time and the observer's latitude, so the overlay stays on the real sky
+without running a full skyfield reduction every frame.
+"""
+
+import math
+import time
+
+import numpy as np
+
+# milliarcseconds to radians
+MAS = math.pi / (180 * 3600 * 1000)
+
+
+def radec_to_vectors(ra, dec) -> np.ndarray:
+    """
+    Convert right ascensions and declinations (in radians) to an (N, 3) array
+    of ICRS unit rays
+    """
+
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    cos_dec = np.cos(dec)
+
+    return np.stack(
+        [
+            cos_dec * np.cos(ra),
+            cos_dec * np.sin(ra),
+            np.sin(dec),
+        ],
+        axis=-1,
+    )
+
+
+def apply_proper_motion(
+    vectors: np.ndarray,
+    ra_mas_per_year,
+    dec_mas_per_year,
+    years,
+) -> np.ndarray:
+    """
+    Move ICRS unit rays along their proper motion
+
+    Args:
+        ra_mas_per_year: motion in right ascension, already scaled by cos(dec)
+            as in the hipparcos catalog
+        years: time since the catalog epoch
+    """
+
+    x, y, z = vectors[..., 0], vectors[..., 1], vectors[..., 2]
+
+    # unit rays pointing east and north on the sky at each position, the
+    # distance from the pole axis is cos(dec)
+    cos_dec = np.maximum(np.hypot(x, y), 1e-12)
+    east = np.stack([-y / cos_dec, x / cos_dec, np.zeros_like(x)], axis=-1)
+    north = np.stack([-z * x / cos_dec, -z * y / cos_dec, cos_dec], axis=-1)
+
+    years = np.asarray(years, dtype=float)
+    ra_motion = (np.asarray(ra_mas_per_year) * MAS * years)[..., np.newaxis]
+    dec_motion = (np.asarray(dec_mas_per_year) * MAS * years)[..., np.newaxis]
+
+    moved = vectors + east * ra_motion + north * dec_motion
+    return moved / np.linalg.norm(moved, axis=-1)[..., np.newaxis]
+
+
+def horizontal_rotation(t, latitude: float, longitude: float) -> np.ndarray:
+    """
+    Rotation from ICRS rays to the horizontal rays used by the camera
+
+    Horizontal rays point (east, down, north), matching horizontal_to_vectors.
+    Precession and nutation come from skyfield, polar motion, aberration and
+    refraction are ignored.
+
+    Args:
+        t: skyfield Time
+        latitude: observer's latitude in radians
+        longitude: observer's longitude in radians, east positive
+    """
+
+    # local apparent sidereal time
+    lst = math.radians(t.gast * 15) + longitude
+
+    cos_lst, sin_lst = math.cos(lst), math.sin(lst)
+    cos_lat, sin_lat = math.cos(latitude), math.sin(latitude)
+
+    # rotation from the true equator of date to (east, down, north)
+    equatorial_to_horizontal = np.array(
+        [
+            [-sin_lst, cos_lst, 0],
+            [-cos_lat * cos_lst, -cos_lat * sin_lst, -sin_lat],
+            [-sin_lat * cos_lst, -sin_lat * sin_lst, cos_lat],
+        ]
+    )
+
+    # t.M rotates ICRS to the true equator of date
+    return np.dot(equatorial_to_horizontal, t.M)
+
+
+class SkyFrame:
+    """
+    The current rotation from ICRS rays to horizontal rays, refreshed on a
+    short cadence
+    """
+
+    def __init__(self, ts, latitude: float, longitude: float, interval: float = 1.0):
+        """
+        Args:
+            ts: skyfield Timescale
+            latitude: observer's latitude in radians
+            longitude: observer's longitude in radians, east positive
+            interval: seconds between refreshes
+        """
+
+        self.ts = ts
+        self.latitude = latitude
+        self.longitude = longitude
+        self.interval = interval
+
+        self.matrix = np.eye(3)
+        self.last_update = -math.inf
+        self.update()
+
+    def update(self) -> bool:
+        """
+        Refresh the rotation if it is due
+
+        Returns:
+            Whether the rotation changed
+        """
+
+        now = time.monotonic()
+        if now - self.last_update < self.interval:
+            return False
+
+        self.last_update = now
+        self.matrix = horizontal_rotation(
+            self.ts.now(),
+            self.latitude,
+            self.longitude,
+        )
+        return True
@@ -0,0 +1,199 @@
+"""
+A spatial index over the celestial sphere
+
+Rays are split into tiles by projecting them onto the faces of a cube and
+dividing each face into a square grid. Rays are kept sorted by tile so each tile
+is a contiguous slice, and the tiles overlapping a view cone can be found with
+one dot product per tile. Within a tile, rays can be sorted by a priority (like
+magnitude) so a query can take just the prefix of each tile under a limit.
+"""
+
+import math
+from typing import Optional
+
+import numpy as np
+
+
+def cube_face_coordinates(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Project rays onto the faces of a cube
+
+    Returns:
+        A tuple containing the face of each ray (0 to 5) and the (N, 2)
+        position of each ray on its face, from -1 to 1
+    """
+
+    axes = np.argmax(np.abs(vectors), axis=1)
+    rows = np.arange(vectors.shape[0])
+    major = vectors[rows, axes]
+
+    faces = axes * 2 + (major < 0)
+
+    uv = np.empty((vectors.shape[0], 2))
+    uv[:, 0] = vectors[rows, (axes + 1) % 3] / np.abs(major)
+    uv[:, 1] = vectors[rows, (axes + 2) % 3] / np.abs(major)
+
+    return faces, uv
+
+
+def cube_face_vectors(faces: np.ndarray, uv: np.ndarray) -> np.ndarray:
+    """
+    The inverse of cube_face_coordinates, returns (N, 3) unit rays
+    """
+
+    axes = faces // 2
+    signs = np.where(faces % 2, -1.0, 1.0)
+    rows = np.arange(faces.shape[0])
+
+    vectors = np.empty((faces.shape[0], 3))
+    vectors[rows, axes] = signs
+    vectors[rows, (axes + 1) % 3] = uv[:, 0]
+    vectors[rows, (axes + 2) % 3] = uv[:, 1]
+
+    return vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+
+
+class SkyIndex:
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        subdivisions: int = 16,
+        priorities: Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            vectors: (N, 3) array of unit rays to index
+            subdivisions: number of tiles along each edge of a cube face
+            priorities: optional value to sort the rays by within each tile,
+                lower first
+        """
+
+        self.subdivisions = subdivisions
+        tile_count = 6 * subdivisions**2
+
+        # find the tile of every ray
+        faces, uv = cube_face_coordinates(vectors)
+        cells = np.clip(((uv + 1) / 2 * subdivisions).astype(int), 0, subdivisions - 1)
+        tiles = (faces * subdivisions + cells[:, 0]) * subdivisions + cells[:, 1]
+
+        # sort the rays by tile, a stable sort keeps any existing order (like
+        # brightness) within each tile
+        if priorities is None:
+            self.order = np.argsort(tiles, kind="stable")
+        else:
+            self.order = np.lexsort((priorities, tiles))
+        sorted_tiles = tiles[self.order]
+        self.starts = np.searchsorted(sorted_tiles, np.arange(tile_count), "left")
+        self.stops = np.searchsorted(sorted_tiles, np.arange(tile_count), "right")
+
+        # a single sorted key of tile and priority, to find the prefix of each
+        # tile under a priority limit with one search
+        self.prioritized = priorities is not None
+        self._priority_keys = None
+        if priorities is not None and len(priorities):
+            self._priority_base = float(np.min(priorities))
+            self._priority_span = float(np.max(priorities)) - self._priority_base + 1
+            self._priority_keys = self._priority_key(
+                sorted_tiles,
+                priorities[self.order],
+            )
+
+        # find the center and angular radius of every tile
+        tile_ids = np.arange(tile_count)
+        tile_faces = tile_ids // subdivisions**2
+        tile_cells = np.stack(
+            [
+                (tile_ids // subdivisions) % subdivisions,
+                tile_ids % subdivisions,
+            ],
+            axis=-1,
+        )
+
+        cell_size = 2 / subdivisions
+        self.centers = cube_face_vectors(
+            tile_faces,
+            (tile_cells + 0.5) * cell_size - 1,
+        )
+
+        cos_radii = np.ones(tile_count)
+        for corner in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+            corners = cube_face_vectors(
+                tile_faces,
+                (tile_cells + corner) * cell_size - 1,
+            )
+            cos_radii = np.minimum(cos_radii, np.sum(corners * self.centers, axis=1))
+        self.radii = np.arccos(np.clip(cos_radii, -1, 1))
+
+        # skip empty tiles when querying
+        self._occupied = np.flatnonzero(self.stops > self.starts)
+
+    def query_tiles(self, direction: np.ndarray, half_angle: float) -> np.ndarray:
+        """
+        Find the occupied tiles that overlap a view cone
+
+        Args:
+            direction: unit ray along the center of the cone
+            half_angle: angle from the center to the edge of the cone in radians
+        """
+
+        tiles = self._occupied
+        reach = np.minimum(half_angle + self.radii[tiles], math.pi)
+
+        return tiles[np.dot(self.centers[tiles], direction) >= np.cos(reach)]
+
+    def query(
+        self,
+        direction: np.ndarray,
+        half_angle: float,
+        priority_limit: Optional[float] = None,
+    ) -> np.ndarray:
+        """
+        Find the rays in the tiles that overlap a view cone
+
+        Args:
+            priority_limit: only include rays with a priority up to this value,
+                requires the index to be built with priorities
+
+        Returns:
+            Indices of the rays, in sorted order (see SkyIndex.order)
+
+        Raises:
+            ValueError: if given a priority_limit without priorities
+        """
+
+        if priority_limit is not None and not self.prioritized:
+            raise ValueError("priority_limit needs an index built with priorities")
+
+        tiles = self.query_tiles(direction, half_angle)
+        stops = self.stops[tiles]
+
+        # without any rays there are no tiles to cut down
+        if priority_limit is not None and self._priority_keys is not None:
+            # cut each tile down to the prefix under the limit
+            limit = min(priority_limit, self._priority_base + self._priority_span - 1)
+            stops = np.searchsorted(
+                self._priority_keys,
+                self._priority_key(tiles, limit),
+                "right",
+            )
+            stops = np.maximum(stops, self.starts[tiles])
+
+        return tile_ranges(self.starts[tiles], stops)
+
+    def _priority_key(self, tiles, priorities):
+        return tiles * self._priority_span + (priorities - self._priority_base)
+
+
+def tile_ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """
+    Concatenate the ranges [start, stop) into one array of indices
+    """
+
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=int)
+
+    # offset of each range's first index from its position in the output
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return np.arange(total) + offsets
@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import Callable, Optional
+
+from starfinder.bodies import Bodies
+from starfinder.sky_frame import SkyFrame
+from starfinder.stars import Stars
+
+
+@dataclass
+class SkySnapshot:
+    """
+    Everything needed to render the sky for one observer location
+    """
+
+    coordinates: tuple[float, float]
+    sky_frame: SkyFrame
+    stars: Stars
+    bodies: Bodies
+    prepared_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def age(self) -> float:
+        """
+        Seconds since the snapshot was prepared
+        """
+
+        return time.monotonic() - self.prepared_at
+
+
+class SkyLoader(threading.Thread):
+    """
+    Prepares sky snapshots on a background thread
+
+    The render loop keeps drawing its current snapshot and swaps in a new one
+    with take() once it is ready.
+    """
+
+    def __init__(self, prepare: Callable[[tuple[float, float]], SkySnapshot]):
+        super().__init__()
+        self.daemon = True
+
+        self.prepare = prepare
+
+        self.request_lock = threading.Lock()
+        self.requested = threading.Event()
+        self.pending_coordinates = None
+        self.requested_at = None
+
+        self.ready = None
+
+        self.start()
+
+    def request(self, coordinates: tuple[float, float]):
+        """
+        Ask for a snapshot at new coordinates, replacing any request that has
+        not started yet
+        """
+
+        # set under the lock, so run() can't finish a snapshot in between and
+        # clear requested_at for this request
+        with self.request_lock:
+            self.pending_coordinates = coordinates
+            if self.requested_at is None:
+                self.requested_at = time.monotonic()
+            self.requested.set()
+
+    def take(self) -> Optional[SkySnapshot]:
+        """
+        Get the newest finished snapshot, or None if there isn't a new one
+        """
+
+        with self.request_lock:
+            snapshot, self.ready = self.ready, None
+        return snapshot
+
+    @property
+    def pending_for(self) -> float:
+        """
+        Seconds the oldest unfinished request has been waiting, 0 when idle
+        """
+
+        requested_at = self.requested_at
+        if requested_at is None:
+            return 0.0
+        return time.monotonic() - requested_at
+
+    def run(self):
+        while True:
+            self.requested.wait()
+
+            with self.request_lock:
+                self.requested.clear()
+                coordinates = self.pending_coordinates
+
+            try:
+                snapshot = self.prepare(coordinates)
+            except Exception as e:
+                print(f"Failed to prepare sky: {e}")
+                snapshot = None
+
+            with self.request_lock:
+                if snapshot is not None:
+                    self.ready = snapshot
+
+                # only done if nothing new was asked for in the meantime
+                if not self.requested.is_set():
+                    self.requested_at = None
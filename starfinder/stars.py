@@ -1,104 +1,196 @@
-from dataclasses import dataclass
-from typing import Optional
+import math
 from pygame import Surface
-import pandas as pd
-import pygame
-from skyfield.units import Angle, Distance
-from skyfield.api import Star
+import numpy as np
+from skyfield.units import Angle
 
-from starfinder.camera import Camera, HorizontalCoordinates
-from starfinder.gfx import draw_aa_filled_circle
+from starfinder.camera import Camera, view_half_angle
+from starfinder.gfx import disc_sprites
+from starfinder.catalog import Catalog
+from starfinder.labels import Labels
+from starfinder.sky_frame import apply_proper_motion
+from starfinder.sky_index import SkyIndex
+from starfinder.text import text_renderer
 
 
-@dataclass
-class IndividualStar:
-    name: str
-    coordinates: HorizontalCoordinates
-    diameter: float
-    label: Optional[Surface]
+# named stars, by hipparcos number
+STAR_LABELS = {
+    11767: "Polaris",
+    69673: "Arcturus",
+    91262: "Vega",
+    78322: "Blaze Star",
+}
+
+# roughly how many stars to draw in a frame, the faintest star shown at each
+# field of view is picked to keep close to this
+STAR_BUDGET = 150
+
+# stars at least this bright are drawn at full brightness, fading down to
+# FAINTEST_BRIGHTNESS for the faintest star shown
+BRIGHTEST_MAGNITUDE = 1.0
+FAINTEST_BRIGHTNESS = 0.4
 
 
 class Stars:
-    def __init__(self, hpc, observer):
-        font = pygame.font.Font(None, 32)
-
-        # ignore NaN values in the hipparcos data
-        # (https://rhodesmill.org/skyfield/stars.html#stars-with-nan-positions)
-        hpc = hpc[hpc["ra_degrees"].notnull()]
-
-        # order by brightness
-        hpc = hpc.sort_values(by="magnitude")
-
-        self.stars = []
-
-        # show brightest stars (and Blaze Star)
-        brightest = hpc.head(100)
-
-        # show other stars of interest
-        other = hpc[hpc.index.isin([78322])]
-
-        hpc = pd.concat([brightest, other])
-        hpc_stars = Star.from_dataframe(hpc)
-
-        alts, azs, ds = observer.observe(hpc_stars).apparent().altaz()
-
-        for hip, alt, az, d in zip(hpc.index, alts.degrees, azs.degrees, ds.km):
-            alt = Angle(degrees=alt)
-            az = Angle(degrees=az)
-            d = Distance(km=d)
-
-            diameter = Angle(degrees=0.01)
-
-            label = None
-            if hip == 11767:
-                label = "Polaris"
-            elif hip == 69673:
-                label = "Arcturus"
-            elif hip == 91262:
-                label = "Vega"
-            elif hip == 78322:
-                label = "Blaze Star"
-
-            if label:
-                label = font.render(label, True, (255, 255, 255))
-
-            self.stars.append(
-                IndividualStar(
-                    name="Star",
-                    coordinates=HorizontalCoordinates(
-                        altitude=alt,
-                        azimuth=az,
-                    ),
-                    diameter=diameter,
-                    label=label,
+    def __init__(
+        self,
+        positions: np.ndarray,
+        magnitudes: np.ndarray,
+        labels: dict[int, Surface],
+        zoom_levels: list[float],
+    ):
+        """
+        Args:
+            positions: (N, 3) array of ICRS unit rays to each star
+            magnitudes: (N,) array of each star's magnitude
+            labels: label surfaces keyed by the star's index in positions
+            zoom_levels: fields of view to precompute magnitude limits for
+        """
+
+        # labeled stars are always shown, so sort them with the brightest
+        priorities = magnitudes.copy()
+        if labels:
+            priorities[list(labels)] = np.min(magnitudes)
+
+        # keep the stars sorted by sky tile and then by brightness, so only the
+        # tiles in view are projected and each tile can be cut at a magnitude
+        self.index = SkyIndex(positions, priorities=priorities)
+        self.positions = positions[self.index.order]
+        self.magnitudes = magnitudes[self.index.order]
+
+        # labels follow their stars into the index order
+        ranks = np.empty_like(self.index.order)
+        ranks[self.index.order] = np.arange(len(ranks))
+        self.labels = {int(ranks[i]): label for i, label in labels.items()}
+
+        self.diameter = Angle(degrees=0.01)
+
+        # precompute the faintest magnitude shown at each zoom level
+        self.zoom_levels = sorted(zoom_levels)
+        self.magnitude_limits = [
+            self.budget_magnitude_limit(np.sort(magnitudes), fov)
+            for fov in self.zoom_levels
+        ]
+
+    @staticmethod
+    def budget_magnitude_limit(sorted_magnitudes: np.ndarray, fov: float) -> float:
+        """
+        The faintest magnitude that keeps the stars in view near STAR_BUDGET
+        """
+
+        if len(sorted_magnitudes) == 0:
+            return 0.0
+
+        # the fraction of the sky in view, assuming stars are spread evenly
+        sky_fraction = (1 - math.cos(view_half_angle(fov))) / 2
+
+        count = int(STAR_BUDGET / sky_fraction)
+        count = min(max(count, 1), len(sorted_magnitudes))
+
+        return float(sorted_magnitudes[count - 1])
+
+    def magnitude_limit(self, fov: float) -> float:
+        """
+        The faintest magnitude shown at a field of view, interpolated between
+        the zoom levels
+        """
+
+        return float(np.interp(fov, self.zoom_levels, self.magnitude_limits))
+
+    def brightness(self, magnitudes: np.ndarray, magnitude_limit: float) -> np.ndarray:
+        """
+        How bright to draw stars, from 0 to 1, when the faintest star shown is
+        at magnitude_limit
+        """
+
+        faintness = (magnitudes - BRIGHTEST_MAGNITUDE) / max(
+            magnitude_limit - BRIGHTEST_MAGNITUDE,
+            1e-6,
+        )
+        return 1 - (1 - FAINTEST_BRIGHTNESS) * np.clip(faintness, 0, 1)
+
+    @classmethod
+    def from_catalog(cls, catalog: Catalog, t, zoom_levels: list[float]) -> "Stars":
+        """
+        Load the stars from a catalog, moved along their proper motion to the
+        time t
+        """
+
+        text = text_renderer(32)
+
+        positions = apply_proper_motion(
+            catalog.positions,
+            catalog.ra_mas_per_year,
+            catalog.dec_mas_per_year,
+            t.J - catalog.epoch_year,
+        )
+
+        labels = {}
+        for i in np.flatnonzero(np.isin(catalog.hip, list(STAR_LABELS))):
+            label = STAR_LABELS[int(catalog.hip[i])]
+            labels[int(i)] = text.render(label)
+
+        return cls(
+            positions,
+            np.asarray(catalog.magnitudes, dtype=float),
+            labels,
+            zoom_levels,
+        )
+
+    def render(
+        self,
+        camera: Camera,
+        surface: Surface,
+        frame: np.ndarray,
+        labels: Labels,
+    ):
+        """
+        Args:
+            frame: rotation from ICRS rays to horizontal rays (see SkyFrame)
+            labels: where the star labels are added for this frame
+        """
+
+        # calculate the diameter of the stars
+        diameter = camera.project_angle(self.diameter)
+        diameter = max(1, diameter)
+
+        # increase diameter so it's more visible
+        diameter *= 5
+        radius = diameter / 2
+
+        # only look at the stars in the sky tiles around the view
+        direction, half_angle = camera.view_cone(frame)
+        magnitude_limit = self.magnitude_limit(camera.fov)
+        indices = self.index.query(
+            direction,
+            half_angle + camera.unproject_length(radius),
+            priority_limit=magnitude_limit,
+        )
+
+        # project those stars at once and keep the ones that land on screen
+        screen_points, visible = camera.project_points(
+            self.positions[indices],
+            frame,
+            radius,
+        )
+        indices = indices[visible]
+        screen_points = screen_points[visible, :2]
+
+        # render every star in one go, with sprites rounded to half a pixel
+        sprites = disc_sprites(round(radius * 2) / 2, surface.get_bitsize())
+        sprites.draw(
+            surface,
+            screen_points,
+            self.brightness(self.magnitudes[indices], magnitude_limit),
+        )
+
+        # label the named stars, brighter stars win where labels overlap
+        for i, (x, y) in zip(indices.tolist(), screen_points.tolist()):
+            label_surface = self.labels.get(i)
+            if label_surface:
+                labels.add(
+                    ("star", i),
+                    label_surface,
+                    (x, y),
+                    radius,
+                    float(self.magnitudes[i]),
                 )
-            )
-
-    def render(self, camera: Camera, surface: Surface):
-        for body in self.stars:
-            pos = camera.project(body.coordinates)
-            if not pos:
-                continue
-
-            # calculate the diameter of the body
-            diameter = camera.project_angle(body.diameter)
-            diameter = max(1, diameter)
-
-            # increase diameter so it's more visible
-            diameter *= 5
-
-            # render body
-            draw_aa_filled_circle(
-                surface,
-                (255, 255, 255),
-                pos.to_tuple(),
-                diameter / 2,
-            )
-
-            # render label under the body
-            if body.label:
-                label = body.label.get_rect()
-                label.centerx = pos.x
-                label.top = pos.y + diameter / 2.0 + 6
-
-                surface.blit(body.label, label)
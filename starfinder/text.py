@@ -0,0 +1,165 @@
+"""
+Shared, cached text rendering
+
+Rendering text with pygame.font goes through FreeType on every call. A Text
+keeps the surfaces of the strings it has rendered, and draws strings that
+change every frame (like the frame rate) by blitting glyphs from an atlas
+rendered once.
+"""
+
+import functools
+import string
+import threading
+from typing import Optional
+
+import pygame
+from pygame import Rect, Surface
+
+Color = tuple[int, int, int]
+
+# characters rendered into each atlas up front, others are rendered on first use
+ATLAS_CHARACTERS = string.digits + string.ascii_letters + string.punctuation + " "
+
+# how many rendered strings each Text keeps
+STRING_CACHE_SIZE = 64
+
+
+class Text:
+    def __init__(
+        self,
+        size: int,
+        color: Color = (255, 255, 255),
+        background: Optional[Color] = None,
+    ):
+        """
+        Args:
+            size: font size of the default pygame font
+            background: color behind the text, transparent if None
+        """
+
+        self.font = pygame.font.Font(None, size)
+        self.color = color
+        self.background = background
+
+        # the string cache is shared by the render loop and the sky loader
+        self.lock = threading.Lock()
+        self.strings = {}
+
+        # glyphs side by side in one surface, and the (surface, area, advance)
+        # of each
+        glyphs = [
+            (character, self._render(character)) for character in ATLAS_CHARACTERS
+        ]
+        self.atlas = Surface(
+            (
+                sum(glyph.get_width() for _, glyph in glyphs),
+                self.font.get_height(),
+            ),
+            pygame.SRCALPHA if background is None else 0,
+        )
+
+        self.glyphs = {}
+        x = 0
+        for character, glyph in glyphs:
+            # adding onto the empty atlas copies the glyph's alpha as is
+            area = self.atlas.blit(
+                glyph,
+                (x, 0),
+                special_flags=pygame.BLEND_RGBA_ADD,
+            )
+            self.glyphs[character] = (self.atlas, area, self._advance(character))
+            x += glyph.get_width()
+
+    def _render(self, text: str) -> Surface:
+        return self.font.render(text, True, self.color, self.background)
+
+    def _advance(self, character: str) -> int:
+        metrics = self.font.metrics(character)[0]
+        return metrics[4] if metrics else 0
+
+    def render(self, text: str) -> Surface:
+        """
+        Render a string, reusing the surface if it was rendered recently
+        """
+
+        with self.lock:
+            surface = self.strings.pop(text, None)
+            if surface is None:
+                surface = self._render(text)
+                if len(self.strings) >= STRING_CACHE_SIZE:
+                    # forget the least recently used string
+                    del self.strings[next(iter(self.strings))]
+
+            # most recently used strings are kept at the end
+            self.strings[text] = surface
+
+        return surface
+
+    def glyph(self, character: str) -> tuple[Surface, Rect, int]:
+        """
+        The surface and area holding a character's glyph, and how far along to
+        put the next glyph
+        """
+
+        glyph = self.glyphs.get(character)
+        if glyph is None:
+            surface = self._render(character)
+            glyph = (surface, surface.get_rect(), self._advance(character))
+            self.glyphs[character] = glyph
+        return glyph
+
+    def size(self, text: str) -> tuple[int, int]:
+        """
+        The size of a string drawn with draw()
+        """
+
+        width = 0
+        if text:
+            # the last glyph can reach past its advance
+            width = sum(self.glyph(character)[2] for character in text[:-1])
+            width += self.glyph(text[-1])[1].width
+
+        return width, self.font.get_height()
+
+    def draw(self, surface: Surface, text: str, **position) -> Rect:
+        """
+        Draw a string glyph by glyph, without rendering it. Glyphs aren't kerned,
+        so use render() for text that doesn't change.
+
+        Args:
+            position: Rect attributes to place the text with, like
+                center=(x, y) or bottomright=(x, y)
+
+        Returns:
+            The area drawn to
+        """
+
+        rect = Rect((0, 0), self.size(text))
+        for attribute, value in position.items():
+            setattr(rect, attribute, value)
+
+        if self.background is not None:
+            surface.fill(self.background, rect)
+
+        sequence = []
+        x = rect.x
+        for character in text:
+            source, area, advance = self.glyph(character)
+            sequence.append((source, (x, rect.y), area))
+            x += advance
+
+        surface.blits(sequence, doreturn=False)
+        return rect
+
+
+@functools.lru_cache(maxsize=None)
+def text_renderer(
+    size: int,
+    color: Color = (255, 255, 255),
+    background: Optional[Color] = None,
+) -> Text:
+    """
+    The shared Text for a font size and colors
+    """
+
+    return Text(size, color, background)
@@ -1,14 +1,16 @@
 import time
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 import pygame
-from gpiozero import Button
+
+if TYPE_CHECKING:
+    from gpiozero import Button
 
 
 class ZoomButton:
     def __init__(
         self,
         pygame_key: int,
-        physical_button: Optional[Button],
+        physical_button: Optional["Button"],
         on_single_press: Optional[callable],
         on_double_press: Optional[callable],
     ):
@@ -0,0 +1,68 @@
+import os
+
+import pandas as pd
+from skyfield.data import hipparcos
+
+from starfinder.catalog import CACHE_SUFFIX, load_catalog
+
+URL = "https://example.com/hip_main.dat"
+
+
+class StubLoader:
+    """
+    A skyfield Loader whose source file is already downloaded
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path_to(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def open(self, url: str):
+        return open(self.path_to(os.path.basename(url)), "rb")
+
+
+def stars() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "ra_degrees": [10.0, 20.0],
+            "dec_degrees": [5.0, -5.0],
+            "magnitude": [3.0, 1.0],
+            "epoch_year": [1991.25, 1991.25],
+            "ra_mas_per_year": [1.0, 2.0],
+            "dec_mas_per_year": [-1.0, -2.0],
+        },
+        index=pd.Index([7, 9], name="hip"),
+    )
+
+
+def test_unwritable_cache_falls_back_to_the_parsed_catalog(tmp_path, monkeypatch):
+    monkeypatch.setattr(hipparcos, "load_dataframe", lambda f: stars())
+    loader = StubLoader(tmp_path)
+    (tmp_path / "hip_main.dat").write_bytes(b"stars")
+
+    # a directory where the cache goes, so replacing it fails
+    cache_path = tmp_path / ("hip_main.dat" + CACHE_SUFFIX)
+    cache_path.mkdir()
+    (cache_path / "keep").touch()
+
+    catalog = load_catalog(loader, URL)
+
+    assert catalog.hip.tolist() == [9, 7]
+    assert catalog.magnitudes.tolist() == [1.0, 3.0]
+    assert sorted(os.listdir(tmp_path)) == ["hip_main.dat", cache_path.name]
+
+
+def test_cache_is_read_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(hipparcos, "load_dataframe", lambda f: stars())
+    loader = StubLoader(tmp_path)
+    (tmp_path / "hip_main.dat").write_bytes(b"stars")
+
+    written = load_catalog(loader, URL)
+
+    # parsing again would fail, the cache is used instead
+    monkeypatch.setattr(hipparcos, "load_dataframe", None)
+    cached = load_catalog(loader, URL)
+
+    assert cached.hip.tolist() == written.hip.tolist() == [9, 7]
@@ -0,0 +1,50 @@
+import math
+import subprocess
+import sys
+from pathlib import Path
+
+import pygame
+
+from starfinder.camera import PHYSICAL_FOV, Camera
+from starfinder.grid import Grid
+from starfinder.text import text_renderer
+
+
+def test_segments_stay_within_budget():
+    pygame.init()
+    grid = Grid(text_renderer(12))
+
+    for fov in [PHYSICAL_FOV, math.radians(60), math.radians(120)]:
+        for pitch in range(-80, 81, 20):
+            camera = Camera(math.radians(pitch), math.radians(30), 0, fov)
+            _, counts = grid.lines(camera)
+
+            assert counts
+            assert sum(counts) - len(counts) <= grid.max_segments
+
+
+def test_render_on_16_bit_surface():
+    # pygame's blended anti-aliased lines corrupt memory on 16 bit surfaces,
+    # which crashes a later allocation, so draw many frames in a fresh process
+    script = """
+import math
+import pygame
+from starfinder.camera import Camera
+from starfinder.grid import Grid
+from starfinder.text import text_renderer
+
+pygame.init()
+grid = Grid(text_renderer(12))
+for pitch in range(-80, 81, 10):
+    surface = pygame.Surface((240, 240), 0, 16)
+    for yaw in range(0, 360, 15):
+        camera = Camera(math.radians(pitch), math.radians(yaw), 0, math.radians(120))
+        grid.render(camera, surface)
+"""
+
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        cwd=Path(__file__).parent.parent,
+    )
+    assert result.returncode == 0, result.stderr.decode()
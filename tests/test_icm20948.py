@@ -0,0 +1,23 @@
+from benchmarks.icm20948 import SimulatedBus
+from starfinder.icm20948 import (
+    ICM20948,
+    ICM20948_ACCEL_CONFIG,
+    ICM20948_GYRO_CONFIG_1,
+)
+
+
+def test_low_pass_mode_is_in_bits_5_to_3():
+    bus = SimulatedBus()
+    imu = ICM20948(i2c_bus=bus)
+
+    imu.set_accelerometer_full_scale(16)
+    imu.set_gyro_full_scale(2000)
+    imu.set_accelerometer_low_pass(enabled=True, mode=3)
+    imu.set_gyro_low_pass(enabled=True, mode=3)
+
+    # DLPFCFG 3, full scale 3, FCHOICE on
+    assert bus.banks[2][ICM20948_ACCEL_CONFIG] == 0b011111
+    assert bus.banks[2][ICM20948_GYRO_CONFIG_1] == 0b011111
+
+    imu.set_gyro_low_pass(enabled=False, mode=0)
+    assert bus.banks[2][ICM20948_GYRO_CONFIG_1] == 0b000110
@@ -0,0 +1,22 @@
+import pygame
+
+from starfinder.labels import REUSE_DISTANCE, Labels
+
+
+def test_drift_adds_up_from_the_last_layout():
+    labels = Labels()
+    surface = pygame.Surface((240, 240))
+    label = pygame.Surface((20, 10))
+
+    layouts = []
+    for x in range(100, 100 + 2 * REUSE_DISTANCE + 3):
+        # one pixel per frame, never more than REUSE_DISTANCE between frames
+        labels.add("star", label, (x, 120), 2, 0)
+        labels.render(surface)
+        layouts.append(labels.layouts)
+
+    # laid out on the first frame, reused while the drift stays within
+    # REUSE_DISTANCE, then laid out again once it passes it
+    assert layouts[: REUSE_DISTANCE + 1] == [1] * (REUSE_DISTANCE + 1)
+    assert layouts[REUSE_DISTANCE + 1] == 2
+    assert labels.reuses > 0
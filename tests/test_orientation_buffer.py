@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+
+from starfinder import quaternion
+from starfinder.imu import GYRO_TO_CAMERA, HORIZONTAL_TO_EARTH, SENSOR_TO_CAMERA
+from starfinder.orientation_buffer import Orientation, OrientationBuffer, extrapolate
+
+
+def camera(fused: np.ndarray) -> np.ndarray:
+    return quaternion.multiply(
+        quaternion.multiply(SENSOR_TO_CAMERA, quaternion.conjugate(fused)),
+        HORIZONTAL_TO_EARTH,
+    )
+
+
+def test_gyro_rates_extrapolate_the_camera():
+    rng = np.random.default_rng(0)
+    fused = rng.normal(size=4)
+    fused /= np.linalg.norm(fused)
+    gyro = rng.normal(size=3)
+
+    # the fusion turns by the gyro's rates in the IMU's axes
+    later = quaternion.multiply(fused, quaternion.from_rotation_vector(gyro * 0.04))
+
+    buffer = OrientationBuffer()
+    buffer.publish(0.0, Orientation(camera(fused)), np.dot(GYRO_TO_CAMERA, gyro))
+    predicted = extrapolate(buffer.latest(), 0.04)
+
+    assert quaternion.angle_between(predicted.quaternion, camera(later)) < 1e-9
+
+
+def test_predictions_are_checked_by_the_writer():
+    buffer = OrientationBuffer()
+    turn = np.array([0.0, math.radians(10), 0.0])
+    buffer.publish(0.0, Orientation(np.array([1.0, 0.0, 0.0, 0.0])), turn)
+
+    predicted = buffer.predict(0.04)
+    assert buffer.predictions == 1
+    assert buffer.checked == 0
+
+    # reading again doesn't check anything
+    buffer.predict(0.04)
+    assert buffer.checked == 0
+
+    buffer.publish(0.05, extrapolate(buffer.latest(), 0.05), turn)
+    assert buffer.checked == 2
+    assert buffer.error < 1e-9
+    assert math.isclose(
+        buffer.uncompensated_error / 2,
+        quaternion.angle_between(
+            predicted.quaternion, np.array([1.0, 0.0, 0.0, 0.0])
+        ),
+    )
@@ -0,0 +1,44 @@
+import math
+
+import numpy as np
+
+from starfinder import quaternion
+from starfinder.camera import Camera
+from starfinder.scheduler import RenderScheduler
+
+FOV = math.radians(17.6)
+
+
+def noisy(rng: np.random.Generator, degrees: float) -> np.ndarray:
+    return quaternion.from_rotation_vector(
+        rng.normal(scale=math.radians(degrees), size=3)
+    )
+
+
+def test_still_device_is_measured_without_extrapolation():
+    rng = np.random.default_rng(0)
+    scheduler = RenderScheduler()
+    camera = Camera(0, math.radians(180), 0, FOV)
+    sky = object()
+
+    for _ in range(100):
+        # sensor noise well under a pixel, but a few pixels once extrapolated
+        measured = noisy(rng, 0.01)
+        camera.update(quaternion=noisy(rng, 0.2))
+        scheduler.run(camera, sky, lambda: None, measured)
+
+    assert scheduler.frames_rendered == 1
+    assert scheduler.frames_skipped == 99
+
+
+def test_camera_is_measured_without_an_orientation():
+    rng = np.random.default_rng(0)
+    scheduler = RenderScheduler()
+    camera = Camera(0, math.radians(180), 0, FOV)
+    sky = object()
+
+    for _ in range(10):
+        camera.update(quaternion=noisy(rng, 0.2))
+        scheduler.run(camera, sky, lambda: None)
+
+    assert scheduler.frames_rendered == 10
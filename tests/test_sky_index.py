@@ -0,0 +1,38 @@
+import math
+
+import numpy as np
+import pytest
+
+from starfinder.sky_index import SkyIndex
+
+DIRECTION = np.array([0.0, 0.0, 1.0])
+
+
+def rays(count: int) -> np.ndarray:
+    vectors = np.random.default_rng(0).normal(size=(count, 3))
+    return vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+
+
+def test_priority_limit_without_priorities():
+    index = SkyIndex(rays(100))
+
+    assert len(index.query(DIRECTION, math.radians(30)))
+    with pytest.raises(ValueError):
+        index.query(DIRECTION, math.radians(30), priority_limit=5)
+
+
+def test_priority_limit_without_rays():
+    index = SkyIndex(np.empty((0, 3)), priorities=np.empty(0))
+
+    assert len(index.query(DIRECTION, math.radians(30), priority_limit=5)) == 0
+
+
+def test_priority_limit():
+    vectors = rays(1000)
+    priorities = np.random.default_rng(1).uniform(0, 10, len(vectors))
+    index = SkyIndex(vectors, priorities=priorities)
+
+    everything = index.order[index.query(DIRECTION, math.radians(30))]
+    limited = index.order[index.query(DIRECTION, math.radians(30), priority_limit=5)]
+
+    assert set(limited) == {i for i in everything if priorities[i] <= 5}
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from starfinder.sky_loader import SkyLoader, SkySnapshot
+
+TIMEOUT = 5.0
+
+
+class StubPrepare:
+    """
+    Prepares each snapshot only once allowed to
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.finish = threading.Event()
+
+    def __call__(self, coordinates: tuple[float, float]) -> SkySnapshot:
+        self.started.set()
+        assert self.finish.wait(TIMEOUT)
+        self.finish.clear()
+        return SkySnapshot(coordinates, None, None, None)
+
+
+def wait_for(condition) -> bool:
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def test_snapshot_is_swapped_in_once_ready():
+    prepare = StubPrepare()
+    loader = SkyLoader(prepare)
+
+    assert loader.take() is None
+    assert loader.pending_for == 0
+
+    loader.request((39.8, -84.2))
+    assert prepare.started.wait(TIMEOUT)
+
+    # still preparing, nothing to swap in and the request is waiting
+    time.sleep(0.01)
+    assert loader.take() is None
+    assert loader.pending_for >= 0.01
+
+    prepare.finish.set()
+    assert wait_for(lambda: loader.pending_for == 0)
+
+    snapshot = loader.take()
+    assert snapshot is not None
+    assert snapshot.coordinates == (39.8, -84.2)
+    assert snapshot.age >= 0
+
+    # taken only once
+    assert loader.take() is None
+
+
+def test_request_while_preparing_stays_pending():
+    prepare = StubPrepare()
+    loader = SkyLoader(prepare)
+
+    loader.request((0.0, 0.0))
+    assert prepare.started.wait(TIMEOUT)
+    prepare.started.clear()
+
+    # asked for again before the first is done, the newer request is still
+    # waiting after the first is ready
+    loader.request((1.0, 1.0))
+    prepare.finish.set()
+    assert prepare.started.wait(TIMEOUT)
+    assert loader.pending_for > 0
+
+    prepare.finish.set()
+    assert wait_for(lambda: loader.pending_for == 0)
+    assert loader.take().coordinates == (1.0, 1.0)